@@ -0,0 +1,85 @@
+"""
+Learner analytics.
+Keeps a per-student, per-document, per-topic mastery row in SQLite: attempt
+and correct counts plus an exponentially weighted accuracy in which recent
+answers count most. Each answer is a single upsert, and weak areas, learning
+paths and quiz focus topics are read straight from these rows rather than
+from answer history.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from backend.settings import ANALYTICS_DB, ANALYTICS_DECAY, ANALYTICS_WEAK_THRESHOLD
+
+_COLUMNS = ("student_id", "doc_hash", "topic", "attempts", "correct", "accuracy", "last_seen_at")
+
+# Accuracy assumed before a topic's first answer, so one answer is not decisive
+_PRIOR = 0.5
+
+
+class LearnerAnalytics:
+    def __init__(self, db_path: str, decay: float = ANALYTICS_DECAY, weak_threshold: float = ANALYTICS_WEAK_THRESHOLD):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.decay = decay
+        self.weak_threshold = weak_threshold
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS mastery (student_id TEXT NOT NULL, doc_hash TEXT NOT NULL, topic TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL, correct INTEGER NOT NULL, accuracy REAL NOT NULL, last_seen_at REAL NOT NULL, "
+            "PRIMARY KEY (student_id, doc_hash, topic))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS mastery_accuracy ON mastery (student_id, doc_hash, accuracy)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def record(self, student_id: str, doc_hash: str, topic: str, is_correct: bool):
+        """Fold one graded answer into the student's mastery of a topic"""
+        score = 1.0 if is_correct else 0.0
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO mastery (student_id, doc_hash, topic, attempts, correct, accuracy, last_seen_at) "
+                "VALUES (?, ?, ?, 1, ?, ?, ?) "
+                "ON CONFLICT(student_id, doc_hash, topic) DO UPDATE SET attempts = attempts + 1, "
+                "correct = correct + excluded.correct, "
+                "accuracy = ? * excluded.correct + (1 - ?) * accuracy, last_seen_at = excluded.last_seen_at",
+                (student_id, doc_hash, topic or "Unknown", int(score),
+                 self.decay * score + (1 - self.decay) * _PRIOR, time.time(), self.decay, self.decay),
+            )
+            self._db.commit()
+
+    def mastery(self, student_id: str, doc_hash: Optional[str] = None) -> List[dict]:
+        """Mastery rows for a student, weakest first; all documents unless doc_hash is given"""
+        query = f"SELECT {', '.join(_COLUMNS)} FROM mastery WHERE student_id = ?"
+        params = [student_id]
+        if doc_hash:
+            query += " AND doc_hash = ?"
+            params.append(doc_hash)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY accuracy", params).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def weak_topics(self, student_id: str, doc_hash: Optional[str] = None, limit: int = 3) -> List[dict]:
+        """Topics answered wrong at least once whose decayed accuracy is below the weak threshold, weakest first"""
+        rows = self.mastery(student_id, doc_hash)
+        return [row for row in rows if row["accuracy"] < self.weak_threshold and row["correct"] < row["attempts"]][:limit]
+
+    def learning_path(self, student_id: str, doc_hash: Optional[str] = None, limit: int = 3) -> List[str]:
+        """Next steps: review the weakest topics, or move on once none are weak"""
+        weak = self.weak_topics(student_id, doc_hash, limit)
+        if weak:
+            return [f"Review {row['topic']} ({row['accuracy']:.0%} recent accuracy)" for row in weak]
+        if self.mastery(student_id, doc_hash):
+            return ["All practiced topics are on track; try a harder difficulty"]
+        return []
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+learner_analytics = LearnerAnalytics(ANALYTICS_DB)
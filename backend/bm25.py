@@ -0,0 +1,62 @@
+"""
+Okapi BM25 over one document's chunks.
+Built once at ingestion as an inverted index (term -> chunk rows and term
+frequencies), so lexical queries touch only the postings of their terms.
+Tokens keep digits and symbols joined, so formula names and chemical symbols
+such as "H2SO4" or "x^2" survive as single terms.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+_TERM = re.compile(r"[a-z0-9]+(?:[\^_.+\-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TERM.findall(text.lower())
+
+
+class BM25Index:
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for row, document in enumerate(documents):
+            counts = Counter(tokenize(document))
+            lengths[row] = sum(counts.values())
+            for term, tf in counts.items():
+                rows, tfs = postings.setdefault(term, ([], []))
+                rows.append(row)
+                tfs.append(tf)
+        average = float(lengths.mean()) if self.size else 0.0
+        # Length normalisation is per row and fixed, so precompute k1 * (1 - b + b * len / avg)
+        self._norms = k1 * (1 - b + b * lengths / max(average, 1e-9))
+        self._postings = {
+            term: (np.asarray(rows, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+            for term, (rows, tfs) in postings.items()
+        }
+        self._idf = {
+            term: math.log(1 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+            for term, (rows, _) in self._postings.items()
+        }
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """(chunk row, score) pairs for the best-matching chunks, highest first"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            rows, tfs = posting
+            scores[rows] += self._idf[term] * tfs * (self.k1 + 1) / (tfs + self._norms[rows])
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        matched = matched[np.argsort(-scores[matched])]
+        return [(int(row), float(scores[row])) for row in matched]
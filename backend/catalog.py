@@ -0,0 +1,83 @@
+"""
+Catalog of documents stored in the vector backend.
+Records each ingested document's hash, path and chunk count, and when it was
+last used, so unused documents can be evicted after DOC_TTL_SECONDS.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from backend.settings import CATALOG_DB, CATALOG_TOUCH_INTERVAL_SECONDS
+
+_COLUMNS = ("doc_hash", "pdf_path", "chunk_count", "created_at", "last_used_at")
+
+
+class DocumentCatalog:
+    def __init__(self, db_path: str, touch_interval: float = CATALOG_TOUCH_INTERVAL_SECONDS):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.touch_interval = touch_interval
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents (doc_hash TEXT PRIMARY KEY, pdf_path TEXT NOT NULL, "
+            "chunk_count INTEGER NOT NULL, created_at REAL NOT NULL, last_used_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_last_used ON documents (last_used_at)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+
+    def get(self, doc_hash: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM documents WHERE doc_hash = ?", (doc_hash,)
+            ).fetchone()
+        return dict(zip(_COLUMNS, row)) if row else None
+
+    def record(self, doc_hash: str, pdf_path: str, chunk_count: int):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO documents (doc_hash, pdf_path, chunk_count, created_at, last_used_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(doc_hash) DO UPDATE SET pdf_path = excluded.pdf_path, "
+                "chunk_count = excluded.chunk_count, last_used_at = excluded.last_used_at",
+                (doc_hash, pdf_path, chunk_count, now, now),
+            )
+            self._db.commit()
+            self._touched[doc_hash] = now
+
+    def touch(self, doc_hash: str):
+        """Mark a document as used; writes at most once per touch_interval per document"""
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(doc_hash, 0.0) < self.touch_interval:
+                return
+            self._touched[doc_hash] = now
+            self._db.execute("UPDATE documents SET last_used_at = ? WHERE doc_hash = ?", (now, doc_hash))
+            self._db.commit()
+
+    def remove(self, doc_hash: str):
+        with self._lock:
+            self._db.execute("DELETE FROM documents WHERE doc_hash = ?", (doc_hash,))
+            self._db.commit()
+            self._touched.pop(doc_hash, None)
+
+    def unused_since(self, cutoff: float) -> List[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT doc_hash FROM documents WHERE last_used_at < ?", (cutoff,)).fetchall()
+        return [row[0] for row in rows]
+
+    def all(self) -> List[dict]:
+        with self._lock:
+            rows = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM documents ORDER BY last_used_at").fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+catalog = DocumentCatalog(CATALOG_DB)
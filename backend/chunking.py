@@ -0,0 +1,187 @@
+"""
+Structure-aware chunking of extracted PDF pages.
+Pages are streamed in, split into sentences, grouped under the nearest
+heading and packed into chunks of roughly CHUNK_TOKENS tokens, with the last
+CHUNK_OVERLAP_TOKENS tokens of each chunk repeated at the start of the next.
+Every chunk records the pages it came from.
+"""
+
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple, TypedDict
+
+from backend.settings import CHUNK_MIN_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS
+
+
+class Chunk(TypedDict):
+    text: str
+    chunk_index: int
+    page_start: int  # 1-based
+    page_end: int
+    heading: str
+
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_NUMBERED_HEADING = re.compile(r"^(chapter|section|unit|part|lesson)\s+\w+|^\d+(\.\d+)*\.?\s+\S", re.IGNORECASE)
+_PAGE_NUMBER = re.compile(r"^(page\s+)?\d+(\s+of\s+\d+)?$", re.IGNORECASE)
+_BULLET = re.compile(r"^([-•*▪◦]|\(?[a-z0-9]{1,3}[.)])\s+", re.IGNORECASE)
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count: words and punctuation marks"""
+    return len(_TOKEN.findall(text))
+
+
+def is_heading(line: str, isolated: bool = False) -> bool:
+    """
+    Short line without sentence punctuation that is numbered or ALL CAPS.
+    Title Case alone ("Albert Einstein", "New York City") is too common in
+    running text, so it counts only for a line isolated by blank lines.
+    """
+    words = line.split()
+    if not words or len(words) > 12 or line.endswith((".", ",", ";", "?", "!")):
+        return False
+    numbered = bool(_NUMBERED_HEADING.match(line))
+    if numbered:
+        if not line[0].isdigit():
+            return True
+        # "2.1 Cell Structure" is a heading, "1. plants need water" is a list item
+        words = words[1:]
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) < 3 or line.endswith(":"):
+        return False
+    if line.isupper():
+        return True
+    # Title Case: every word longer than three letters is capitalized
+    significant = [word for word in words if len(word) > 3]
+    title_case = bool(significant) and all(word[0].isupper() for word in significant)
+    if numbered:
+        return title_case
+    return isolated and title_case and len(words) >= 2
+
+
+def _blocks(page_text: str) -> Iterator[Tuple[str, str]]:
+    """Yield ("heading", line) and ("text", paragraph) blocks, re-joining wrapped lines"""
+    paragraph: List[str] = []
+
+    def flush():
+        text = " ".join(paragraph)
+        paragraph.clear()
+        # Re-join words hyphenated across a line break
+        return re.sub(r"(\w)- (\w)", r"\1\2", text)
+
+    lines = [" ".join(raw.split()) for raw in page_text.splitlines()]
+    lines = [line for line in lines if not _PAGE_NUMBER.match(line)]
+    after_heading = False
+    for i, line in enumerate(lines):
+        if not line:
+            if paragraph:
+                yield "text", flush()
+            after_heading = False
+            continue
+        # Blank lines (or the page edge) on both sides set a line apart from the running text;
+        # a heading line directly above counts as a blank, so "Chapter 2" / "Cell Biology" both qualify
+        isolated = (i == 0 or not lines[i - 1] or after_heading) and (i + 1 == len(lines) or not lines[i + 1])
+        after_heading = is_heading(line, isolated)
+        if after_heading:
+            if paragraph:
+                yield "text", flush()
+            yield "heading", line
+        elif _BULLET.match(line) and paragraph:
+            # List items are kept as their own sentences
+            yield "text", flush()
+            paragraph.append(line)
+        else:
+            paragraph.append(line)
+    if paragraph:
+        yield "text", flush()
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def _split_long(sentence: str, max_tokens: int) -> List[str]:
+    """Break a run-on 'sentence' (tables, formulas) into word windows under max_tokens"""
+    pieces, current, size = [], [], 0
+    for word in sentence.split():
+        tokens = count_tokens(word)
+        if current and size + tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, size = [], 0
+        current.append(word)
+        size += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_pages(pages: Iterable[str], target_tokens: int = CHUNK_TOKENS,
+                overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                min_tokens: int = CHUNK_MIN_TOKENS) -> Iterator[Chunk]:
+    """
+    Lazily turn page texts into chunks. A heading closes the current chunk and
+    is prefixed to every chunk of its section; chunks otherwise flow across
+    page breaks. Fragments under min_tokens (page numbers, stray headers) are dropped.
+    """
+    heading = ""
+    sentences: List[Tuple[str, int, int]] = []  # (sentence, tokens, page)
+    size = 0
+    index = 0
+
+    def emit(carry_overlap: bool) -> Optional[Chunk]:
+        nonlocal sentences, size, index
+        body = " ".join(sentence for sentence, _, _ in sentences)
+        chunk = None
+        if size >= min_tokens:
+            chunk = {
+                "text": f"{heading}\n{body}" if heading else body,
+                "chunk_index": index,
+                "page_start": sentences[0][2],
+                "page_end": sentences[-1][2],
+                "heading": heading,
+            }
+            index += 1
+        kept: List[Tuple[str, int, int]] = []
+        if carry_overlap:
+            kept_size = 0
+            for sentence in reversed(sentences):
+                if kept_size + sentence[1] > overlap_tokens:
+                    break
+                kept.insert(0, sentence)
+                kept_size += sentence[1]
+            # Never carry the whole chunk forward, or the next one would repeat it
+            if len(kept) == len(sentences):
+                kept = []
+        sentences = kept
+        size = sum(tokens for _, tokens, _ in kept)
+        return chunk
+
+    heading_open = False  # True until the current heading has body text
+    for page_number, page_text in enumerate(pages, start=1):
+        for kind, block in _blocks(page_text):
+            if kind == "heading":
+                chunk = emit(carry_overlap=False) if sentences else None
+                if chunk:
+                    yield chunk
+                # Consecutive heading lines (e.g. "Chapter 2" / "Cell Biology", set off from the body) merge
+                merged = f"{heading} - {block}"
+                heading = merged if heading_open and count_tokens(merged) <= 24 else block
+                heading_open = True
+                continue
+            for sentence in split_sentences(block):
+                tokens = count_tokens(sentence)
+                budget = target_tokens - count_tokens(heading)
+                for piece in (_split_long(sentence, budget) if tokens > budget else [sentence]):
+                    piece_tokens = count_tokens(piece)
+                    if sentences and size + piece_tokens > budget:
+                        chunk = emit(carry_overlap=True)
+                        if chunk:
+                            yield chunk
+                    sentences.append((piece, piece_tokens, page_number))
+                    size += piece_tokens
+                    heading_open = False
+    if sentences:
+        chunk = emit(carry_overlap=False)
+        if chunk:
+            yield chunk
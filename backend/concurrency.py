@@ -0,0 +1,26 @@
+"""
+Bounded worker pools for blocking work invoked from async request handlers.
+Graph runs (PDF parsing, embedding, LLM round-trips) execute here so the
+event loop stays free to serve other requests.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.settings import GRAPH_WORKERS
+
+graph_executor = ThreadPoolExecutor(max_workers=GRAPH_WORKERS, thread_name_prefix="edumind-graph")
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """Run a blocking callable on the graph pool and await its result"""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (e.g. the request's trace ID) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(graph_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+def shutdown():
+    graph_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,315 @@
+"""
+Resilient wrapper around genai.GenerativeModel.
+Every call, sync or async, takes a slot from one shared concurrency limit, runs under a deadline, retries transient
+and rate-limit errors with jittered exponential backoff, and can hedge slow
+calls with a duplicate request. Latency and token usage are recorded.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from google.api_core import exceptions as google_exceptions
+
+RATE_LIMIT_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+RETRYABLE_ERRORS = RATE_LIMIT_ERRORS + (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+class LLMError(RuntimeError):
+    """Raised when a Gemini call fails after retries or runs out of time"""
+
+
+class _Slot:
+    """A held concurrency slot, released exactly once; a detached slot is released by the call still using it"""
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._lock = threading.Lock()
+        self._released = False
+        self.detached = False
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._semaphore.release()
+
+
+class GeminiClient:
+    def __init__(self, model, max_concurrency: int, timeout: float, deadline: float,
+                 max_retries: int, backoff_base: float, rate_limit_backoff: float,
+                 hedge_after: float = 0.0):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.rate_limit_backoff = rate_limit_backoff
+        self.hedge_after = hedge_after
+        # One limit shared by the blocking and async APIs (and by hedges)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="gemini")
+        self._lock = threading.Lock()
+        self._last_rate_limit = 0.0
+        self._latencies = deque(maxlen=1000)
+        self.stats = {
+            "calls": 0, "failures": 0, "retries": 0, "rate_limited": 0,
+            "hedged": 0, "hedge_wins": 0, "in_flight": 0,
+            "prompt_tokens": 0, "output_tokens": 0,
+        }
+
+    # Bookkeeping
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _record(self, started: float, response):
+        usage = getattr(response, "usage_metadata", None)
+        with self._lock:
+            self.stats["calls"] += 1
+            self._latencies.append(time.monotonic() - started)
+            if usage is not None:
+                self.stats["prompt_tokens"] += getattr(usage, "prompt_token_count", 0) or 0
+                self.stats["output_tokens"] += getattr(usage, "candidates_token_count", 0) or 0
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        if isinstance(error, RATE_LIMIT_ERRORS):
+            self._count("rate_limited")
+            with self._lock:
+                self._last_rate_limit = time.monotonic()
+            base = self.rate_limit_backoff
+        else:
+            base = self.backoff_base
+        # Full jitter spreads a burst of 429s out instead of retrying in lockstep
+        return random.uniform(0, base * (2 ** (attempt - 1)))
+
+    def _should_hedge(self) -> bool:
+        # Duplicate requests only make a rate-limit storm worse
+        with self._lock:
+            return self.hedge_after > 0 and time.monotonic() - self._last_rate_limit > 30
+
+    def metrics(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            snapshot = dict(self.stats)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        snapshot.update({
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+            "latency_p99": percentile(0.99),
+        })
+        return snapshot
+
+    # Blocking API
+
+    def generate(self, prompt: str):
+        """generate_content with concurrency limit, deadline, retries and hedging"""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count("failures")
+                raise LLMError("Gemini call exceeded its deadline")
+            if not self._slots.acquire(timeout=remaining):
+                self._count("failures")
+                raise LLMError("Timed out waiting for a Gemini concurrency slot")
+            slot = _Slot(self._slots)
+            try:
+                self._count("in_flight")
+                return self._attempt(prompt, min(self.timeout, remaining), slot)
+            except RETRYABLE_ERRORS as e:
+                attempt += 1
+                delay = self._backoff(attempt, e)
+                if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                    self._count("failures")
+                    raise LLMError(f"Gemini call failed after {attempt} attempts: {e}") from e
+                self._count("retries")
+                print(f"Gemini call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            except Exception as e:
+                self._count("failures")
+                raise LLMError(f"Gemini call failed: {e}") from e
+            finally:
+                self._count("in_flight", -1)
+                if not slot.detached:
+                    slot.release()
+            time.sleep(delay)
+
+    def _call(self, prompt: str, timeout: float):
+        started = time.monotonic()
+        response = self.model.generate_content(prompt, request_options={"timeout": timeout})
+        self._record(started, response)
+        return response
+
+    def _hedge_call(self, prompt: str, timeout: float):
+        try:
+            return self._call(prompt, timeout)
+        finally:
+            self._slots.release()
+
+    def _attempt(self, prompt: str, timeout: float, slot: _Slot):
+        if not self._should_hedge():
+            return self._call(prompt, timeout)
+
+        primary = self._hedge_pool.submit(self._call, prompt, timeout)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        # Hedge only with a spare slot, so hedging never queues behind real traffic
+        if done or not self._slots.acquire(blocking=False):
+            return primary.result()
+
+        self._count("hedged")
+        hedge = self._hedge_pool.submit(self._hedge_call, prompt, max(timeout - self.hedge_after, 1.0))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                        if not primary.done():
+                            # A running call can't be cancelled; the caller's slot stays taken until it ends
+                            slot.detached = True
+                            primary.add_done_callback(lambda _: slot.release())
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    # Async API
+
+    async def _acquire_async(self, timeout: float) -> bool:
+        """Take a slot from the shared limit without blocking the event loop"""
+        give_up = time.monotonic() + timeout
+        delay = 0.005
+        while not self._slots.acquire(blocking=False):
+            if time.monotonic() >= give_up:
+                return False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        return True
+
+    async def _async_call(self, prompt: str, timeout: float):
+        started = time.monotonic()
+        response = await asyncio.wait_for(
+            self.model.generate_content_async(prompt, request_options={"timeout": timeout}), timeout
+        )
+        self._record(started, response)
+        return response
+
+    async def _async_attempt(self, prompt: str, timeout: float):
+        if not self._should_hedge():
+            return await self._async_call(prompt, timeout)
+
+        primary = asyncio.ensure_future(self._async_call(prompt, timeout))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done or not self._slots.acquire(blocking=False):
+            return await primary
+
+        self._count("hedged")
+        hedge = asyncio.ensure_future(self._async_call(prompt, max(timeout - self.hedge_after, 1.0)))
+        hedge.add_done_callback(lambda _: self._slots.release())
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The loser is cancelled and awaited, so the caller's slot is held until it has stopped
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def agenerate(self, prompt: str):
+        """Async generate with the same limits, deadline, retries and hedging"""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count("failures")
+                raise LLMError("Gemini call exceeded its deadline")
+            if not await self._acquire_async(remaining):
+                self._count("failures")
+                raise LLMError("Timed out waiting for a Gemini concurrency slot")
+            try:
+                self._count("in_flight")
+                return await self._async_attempt(prompt, min(self.timeout, deadline - time.monotonic()))
+            except (asyncio.TimeoutError,) + RETRYABLE_ERRORS as e:
+                attempt += 1
+                delay = self._backoff(attempt, e)
+                if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                    self._count("failures")
+                    raise LLMError(f"Gemini call failed after {attempt} attempts: {e}") from e
+                self._count("retries")
+                print(f"Gemini call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            except Exception as e:
+                self._count("failures")
+                raise LLMError(f"Gemini call failed: {e}") from e
+            finally:
+                self._count("in_flight", -1)
+                self._slots.release()
+            await asyncio.sleep(delay)
+
+    async def astream(self, prompt: str):
+        """
+        Yield response chunks from the streaming API.
+        Retries happen only before the first chunk; once text has been
+        delivered a failure is raised to the caller.
+        """
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            delivered = False
+            if not await self._acquire_async(max(deadline - time.monotonic(), 0.0)):
+                self._count("failures")
+                raise LLMError("Timed out waiting for a Gemini concurrency slot")
+            try:
+                self._count("in_flight")
+                started = time.monotonic()
+                response = await self.model.generate_content_async(
+                    prompt, stream=True,
+                    request_options={"timeout": max(deadline - time.monotonic(), 1.0)}
+                )
+                last = None
+                async for chunk in response:
+                    delivered = True
+                    last = chunk
+                    yield chunk
+                self._record(started, last)
+                return
+            except RETRYABLE_ERRORS as e:
+                attempt += 1
+                delay = self._backoff(attempt, e)
+                if delivered or attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                    self._count("failures")
+                    raise LLMError(f"Gemini stream failed after {attempt} attempts: {e}") from e
+                self._count("retries")
+            except Exception as e:
+                self._count("failures")
+                raise LLMError(f"Gemini stream failed: {e}") from e
+            finally:
+                self._count("in_flight", -1)
+                self._slots.release()
+            await asyncio.sleep(delay)
@@ -0,0 +1,223 @@
+"""
+Content-addressed ingestion registry.
+A PDF is extracted, chunked and embedded once per unique content hash; every
+later session on the same bytes reuses the cached text, chunks and point IDs.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+import numpy as np
+
+from backend.bm25 import BM25Index
+from backend.catalog import catalog
+from backend.chunking import Chunk, chunk_pages
+from backend.metrics import registry as metrics, traced
+from backend.pdf_extract import iter_page_texts
+from backend.settings import INGEST_CACHE_SIZE, QUESTION_BANK
+from backend.vector_store import add_documents, get_backend, point_id
+
+pages_extracted = metrics.counter("edumind_pages_extracted_total", "PDF pages extracted during ingestion")
+
+
+class IngestedDocument(TypedDict):
+    doc_hash: str
+    pdf_path: str
+    text: str
+    chunks: List[str]
+    chunk_records: List[Chunk]  # Text plus page provenance, aligned with chunks
+    point_ids: List[str]
+    embeddings: np.ndarray  # One float32 row per chunk
+    bm25: Optional[BM25Index]
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionRegistry:
+    """LRU of ingested documents keyed by content hash, with single-flight ingestion"""
+
+    def __init__(self, max_entries: int = INGEST_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._docs: "OrderedDict[str, IngestedDocument]" = OrderedDict()
+        self._path_hashes: Dict[str, Tuple[float, int, str]] = {}
+        self._inflight: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def hash_for_path(self, pdf_path: str) -> str:
+        """Content hash of a file, memoized on (mtime, size) so repeat lookups skip hashing"""
+        stat = os.stat(pdf_path)
+        with self._lock:
+            known = self._path_hashes.get(pdf_path)
+        if known and known[0] == stat.st_mtime and known[1] == stat.st_size:
+            return known[2]
+        doc_hash = file_hash(pdf_path)
+        with self._lock:
+            self._path_hashes[pdf_path] = (stat.st_mtime, stat.st_size, doc_hash)
+        return doc_hash
+
+    def remember_hash(self, pdf_path: str, doc_hash: str):
+        """Record a hash computed elsewhere (e.g. while the file was uploaded) so ingest skips rehashing"""
+        stat = os.stat(pdf_path)
+        with self._lock:
+            self._path_hashes[pdf_path] = (stat.st_mtime, stat.st_size, doc_hash)
+
+    def get(self, doc_hash: str) -> Optional[IngestedDocument]:
+        with self._lock:
+            doc = self._docs.get(doc_hash)
+            if doc is not None:
+                self._docs.move_to_end(doc_hash)
+            return doc
+
+    def forget(self, doc_hash: str):
+        with self._lock:
+            self._docs.pop(doc_hash, None)
+
+    def _store(self, doc: IngestedDocument):
+        with self._lock:
+            self._docs[doc["doc_hash"]] = doc
+            self._docs.move_to_end(doc["doc_hash"])
+            while len(self._docs) > self.max_entries:
+                self._docs.popitem(last=False)
+
+    def ingest(self, pdf_path: str) -> IngestedDocument:
+        """
+        Extract, chunk and embed a PDF unless the same content was already ingested.
+        Concurrent callers for the same document wait for a single ingestion.
+        """
+        try:
+            doc_hash = self.hash_for_path(pdf_path)
+        except OSError as e:
+            # A missing or unreadable file degrades like an unparseable one instead of failing the request
+            print(f"Error reading PDF: {e}")
+            return _unreadable(pdf_path, "")
+        cached = self._cached(doc_hash)
+        if cached is not None:
+            print(f"Ingestion cache hit for {pdf_path} ({doc_hash[:12]})")
+            catalog.touch(doc_hash)
+            return cached
+
+        with self._lock:
+            doc_lock = self._inflight.setdefault(doc_hash, threading.Lock())
+        try:
+            with doc_lock:
+                cached = self._cached(doc_hash)
+                if cached is not None:
+                    return cached
+                previous = catalog.get(doc_hash)
+                # Catalogued before the first upsert, so a concurrent compact keeps the points being written
+                catalog.record(doc_hash, pdf_path, previous["chunk_count"] if previous else 0)
+                try:
+                    doc = _ingest(pdf_path, doc_hash)
+                except BaseException:
+                    _discard(doc_hash)
+                    raise
+                if not doc["chunks"]:
+                    # Extraction failed or found no text: drop whatever was upserted before it stopped
+                    _discard(doc_hash)
+                    return doc
+                if previous and previous["chunk_count"] > len(doc["chunks"]):
+                    # Chunking changed since the last ingest; IDs past the new chunk count are stale
+                    stale = range(len(doc["chunks"]), previous["chunk_count"])
+                    get_backend().delete_points(doc_hash, [point_id(doc_hash, i) for i in stale])
+                catalog.record(doc_hash, pdf_path, len(doc["chunks"]))
+                self._store(doc)
+                if QUESTION_BANK:
+                    # Lazy import: the bank reads documents back through this registry
+                    from backend.question_bank import question_bank
+                    question_bank.schedule(doc_hash)
+                return doc
+        finally:
+            with self._lock:
+                self._inflight.pop(doc_hash, None)
+
+    def _cached(self, doc_hash: str) -> Optional[IngestedDocument]:
+        """The cached document, unless its catalog entry is gone (deleted by another process, e.g. the CLI)"""
+        doc = self.get(doc_hash)
+        if doc is not None and catalog.get(doc_hash) is None:
+            print(f"Document {doc_hash[:12]} was deleted elsewhere; ingesting again")
+            self.forget(doc_hash)
+            if QUESTION_BANK:
+                from backend.question_bank import question_bank
+                question_bank.forget(doc_hash)
+            return None
+        return doc
+
+
+def _discard(doc_hash: str):
+    """Remove the points and catalog entry of an ingestion that did not complete"""
+    try:
+        get_backend().delete_document(doc_hash)
+    except Exception as e:
+        print(f"Cleaning up partial ingestion of {doc_hash[:12]} failed: {e}")
+    catalog.remove(doc_hash)
+
+
+def _unreadable(pdf_path: str, doc_hash: str) -> IngestedDocument:
+    """Placeholder for a PDF that could not be read; never cached, so a later fixed upload is ingested"""
+    return {
+        "doc_hash": doc_hash,
+        "pdf_path": pdf_path,
+        "text": "Error reading PDF content.",
+        "chunks": [],
+        "chunk_records": [],
+        "point_ids": [],
+        "embeddings": np.empty((0, 0), dtype=np.float32),
+        "bm25": None,
+    }
+
+
+@traced("ingestion", "ingest")
+def _ingest(pdf_path: str, doc_hash: str) -> IngestedDocument:
+    print(f"Extracting text from {pdf_path}...")
+    pages: List[str] = []
+    chunks: List[str] = []
+    records: List[Chunk] = []
+    errors: List[Exception] = []
+
+    def stream_pages():
+        for page_text in iter_page_texts(pdf_path):
+            pages.append(page_text)
+            yield page_text
+
+    def stream_chunks():
+        # Chunks are produced as pages arrive from the pool and carry their page numbers
+        try:
+            for chunk in chunk_pages(stream_pages()):
+                chunks.append(chunk["text"])
+                records.append(chunk)
+                yield chunk
+        except Exception as e:
+            errors.append(e)
+
+    metadata = {"source": pdf_path, "pdf_path": pdf_path, "doc_hash": doc_hash}
+    vectors: List[np.ndarray] = []
+    point_ids = add_documents(stream_chunks(), metadata, vector_sink=vectors)
+
+    if errors:
+        print(f"Error reading PDF: {errors[0]}")
+        return _unreadable(pdf_path, doc_hash)
+
+    pages_extracted.inc(len(pages))
+    return {
+        "doc_hash": doc_hash,
+        "pdf_path": pdf_path,
+        "text": "".join(page_text + "\n" for page_text in pages),
+        "chunks": chunks,
+        "chunk_records": records,
+        "point_ids": point_ids,
+        "embeddings": np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32),
+        "bm25": BM25Index(chunks) if chunks else None,
+    }
+
+
+registry = IngestionRegistry()
@@ -0,0 +1,118 @@
+"""
+Background job queue for long-running graph runs.
+A job is submitted with its initial state and returns an ID immediately; a
+worker pool streams the graph node by node, recording progress and partial
+results that clients poll for.
+"""
+
+import contextvars
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from backend.settings import JOB_TTL_SECONDS, JOB_WORKERS
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class Job:
+    def __init__(self, kind: str, steps: List[str]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.steps = steps
+        self.completed_nodes: List[str] = []
+        self.result: dict = {}
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def snapshot(self) -> dict:
+        total = len(self.steps) or 1
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": min(len(set(self.completed_nodes)) / total, 1.0),
+            "completed_nodes": list(self.completed_nodes),
+            "steps": list(self.steps),
+            "result": dict(self.result),
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobManager:
+    """Runs compiled LangGraph graphs on a bounded worker pool and tracks their progress"""
+
+    def __init__(self, max_workers: int = JOB_WORKERS, ttl_seconds: int = JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="edumind-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, graph, initial_state: dict,
+               summarize: Callable[[dict, bool], dict]) -> str:
+        """
+        Queue a graph run and return its job ID.
+        summarize(state, done) turns the current graph state into the job's
+        client-facing result; it is called after every node and once more when
+        the run finishes (done=True).
+        """
+        steps = [name for name in graph.get_graph().nodes if not name.startswith("__")]
+        job = Job(kind, steps)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        # The run keeps the submitting request's context, including its trace ID
+        self._executor.submit(contextvars.copy_context().run, self._run, job, graph, initial_state, summarize)
+        return job.id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.snapshot() if job else None
+
+    def _update(self, job: Job, **fields):
+        with self._lock:
+            for key, value in fields.items():
+                setattr(job, key, value)
+            job.updated_at = time.time()
+
+    def _run(self, job: Job, graph, initial_state: dict, summarize):
+        self._update(job, status=RUNNING)
+        state = dict(initial_state)
+        try:
+            # Each superstep yields its "updates" chunk first, then the merged "values"
+            for mode, chunk in graph.stream(initial_state, stream_mode=["updates", "values"]):
+                if mode == "updates":
+                    for node in chunk:
+                        print(f"Job {job.id[:8]}: {node} done")
+                        self._update(job, completed_nodes=job.completed_nodes + [node])
+                else:
+                    state = chunk
+                    self._update(job, result=summarize(state, False))
+            self._update(job, result=summarize(state, True), status=COMPLETED)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job, status=FAILED, error=str(e))
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.status in (COMPLETED, FAILED) and job.updated_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+job_manager = JobManager()
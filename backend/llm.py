@@ -1,32 +1,168 @@
 import google.generativeai as genai
 from backend.config import GEMINI_API_KEY, GEMINI_MODEL_NAME
+from backend.gemini_client import GeminiClient
+from backend.llm_cache import MISSING, ResponseCache, prompt_key
+from backend.metrics import traced
+from backend.settings import (LLM_BACKOFF_BASE_SECONDS, LLM_CACHE_DB, LLM_CACHE_SIZE, LLM_CACHE_TTL_SECONDS,
+                              LLM_DEADLINE_SECONDS, LLM_HEDGE_AFTER_SECONDS, LLM_MAX_CONCURRENCY,
+                              LLM_MAX_RETRIES, LLM_RATE_LIMIT_BACKOFF_SECONDS, LLM_SEMANTIC_CACHE,
+                              LLM_SEMANTIC_THRESHOLD, LLM_TIMEOUT_SECONDS)
+import asyncio
 import json
+import os
 
 genai.configure(api_key=GEMINI_API_KEY)
 
 # Use the requested model
 model = genai.GenerativeModel(GEMINI_MODEL_NAME)
 
-def generate_text(prompt: str):
+# All calls go through the client for concurrency limits, retries and metrics
+client = GeminiClient(
+    model,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    timeout=LLM_TIMEOUT_SECONDS,
+    deadline=LLM_DEADLINE_SECONDS,
+    max_retries=LLM_MAX_RETRIES,
+    backoff_base=LLM_BACKOFF_BASE_SECONDS,
+    rate_limit_backoff=LLM_RATE_LIMIT_BACKOFF_SECONDS,
+    hedge_after=LLM_HEDGE_AFTER_SECONDS,
+)
+
+TEXT_ERROR_MESSAGE = "I'm sorry, I encountered an error generating the response."
+
+if LLM_CACHE_DB and os.path.dirname(LLM_CACHE_DB):
+    os.makedirs(os.path.dirname(LLM_CACHE_DB), exist_ok=True)
+
+# Successful responses only; errors are never cached
+response_cache = ResponseCache(
+    max_entries=LLM_CACHE_SIZE,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    db_path=LLM_CACHE_DB,
+    semantic_threshold=LLM_SEMANTIC_THRESHOLD,
+)
+
+def cache_stats() -> dict:
+    return response_cache.snapshot()
+
+def client_stats() -> dict:
+    return client.metrics()
+
+def _semantic_vector(query: str):
+    """Normalized embedding of a chat query for near-duplicate lookups, if enabled"""
+    if not (LLM_SEMANTIC_CACHE and query):
+        return None
+    # Shares the retrieval query-vector cache, so a chat turn encodes its query once
+    from backend.vector_store import encode_query
+    return encode_query(query)
+
+def _json_prompt(prompt: str) -> str:
+    # Force JSON structure in prompt
+    return f"{prompt}\n\nReturn the result as a valid JSON object. Do not include markdown formatting like ```json."
+
+def _parse_json(text: str):
+    text = text.strip()
+    # Clean up if model adds markdown
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return json.loads(text)
+
+@traced("llm")
+def generate_text(prompt: str, semantic_query: str = None, semantic_scope: str = ""):
+    """
+    Generate text, served from the response cache when possible.
+    semantic_query lets near-duplicate questions within semantic_scope share a cached answer.
+    """
+    key = prompt_key(GEMINI_MODEL_NAME, "text", prompt)
+    vector = _semantic_vector(semantic_query)
+    cached = response_cache.get(key, semantic_scope, vector)
+    if cached is not MISSING:
+        return cached
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        text = client.generate(prompt).text
     except Exception as e:
         print(f"Error generating text: {e}")
-        return "I'm sorry, I encountered an error generating the response."
+        return TEXT_ERROR_MESSAGE
+    response_cache.put(key, text, semantic_scope, vector)
+    return text
 
+@traced("llm")
 def generate_json(prompt: str):
+    """
+    Generate and parse a JSON response. Returns {} if the model's output is not
+    valid JSON; raises LLMError if Gemini itself could not be reached.
+    """
+    key = prompt_key(GEMINI_MODEL_NAME, "json", prompt)
+    cached = response_cache.get(key)
+    if cached is not MISSING:
+        return cached
+    response = client.generate(_json_prompt(prompt))
     try:
-        # Force JSON structure in prompt
-        json_prompt = f"{prompt}\n\nReturn the result as a valid JSON object. Do not include markdown formatting like ```json."
-        response = model.generate_content(json_prompt)
-        text = response.text.strip()
-        # Clean up if model adds markdown
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.endswith("```"):
-            text = text[:-3]
-        return json.loads(text)
+        result = _parse_json(response.text)
     except Exception as e:
         print(f"Error generating JSON: {e}")
         return {}
+    response_cache.put(key, result)
+    return result
+
+@traced("llm")
+async def generate_text_async(prompt: str, semantic_query: str = None, semantic_scope: str = ""):
+    """Async variant of generate_text for use directly on the event loop"""
+    key = prompt_key(GEMINI_MODEL_NAME, "text", prompt)
+    vector = await asyncio.to_thread(_semantic_vector, semantic_query) if semantic_query else None
+    cached = response_cache.get(key, semantic_scope, vector)
+    if cached is not MISSING:
+        return cached
+    try:
+        text = (await client.agenerate(prompt)).text
+    except Exception as e:
+        print(f"Error generating text: {e}")
+        return TEXT_ERROR_MESSAGE
+    response_cache.put(key, text, semantic_scope, vector)
+    return text
+
+@traced("llm")
+async def generate_json_async(prompt: str):
+    """Async variant of generate_json for use directly on the event loop"""
+    key = prompt_key(GEMINI_MODEL_NAME, "json", prompt)
+    cached = response_cache.get(key)
+    if cached is not MISSING:
+        return cached
+    response = await client.agenerate(_json_prompt(prompt))
+    try:
+        result = _parse_json(response.text)
+    except Exception as e:
+        print(f"Error generating JSON: {e}")
+        return {}
+    response_cache.put(key, result)
+    return result
+
+@traced("llm")
+async def stream_text(prompt: str, semantic_query: str = None, semantic_scope: str = ""):
+    """
+    Yield the response text incrementally from Gemini's streaming API.
+    A cached response is yielded in one piece; a completed stream is cached.
+    A failure before any text yields the usual error message; once text has
+    been yielded the LLMError is raised, so callers never take a truncated
+    answer for a complete one.
+    """
+    key = prompt_key(GEMINI_MODEL_NAME, "text", prompt)
+    vector = await asyncio.to_thread(_semantic_vector, semantic_query) if semantic_query else None
+    cached = response_cache.get(key, semantic_scope, vector)
+    if cached is not MISSING:
+        yield cached
+        return
+    parts = []
+    try:
+        async for chunk in client.astream(prompt):
+            if chunk.text:
+                parts.append(chunk.text)
+                yield chunk.text
+    except Exception as e:
+        print(f"Error streaming text: {e}")
+        if parts:
+            raise
+        yield TEXT_ERROR_MESSAGE
+        return
+    response_cache.put(key, "".join(parts), semantic_scope, vector)
@@ -0,0 +1,153 @@
+"""
+Response cache for Gemini calls.
+Exact lookups by prompt hash go through an in-process LRU with TTL, backed by
+an optional SQLite store that survives restarts. Chat queries can also hit a
+semantic index that matches near-duplicate questions by embedding similarity.
+"""
+
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MISSING = object()
+
+
+def prompt_key(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of JSON-serializable LLM responses with an optional SQLite tier"""
+
+    def __init__(self, max_entries: int, ttl_seconds: int, db_path: str = "",
+                 max_disk_entries: int = 0, semantic_threshold: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries or max_entries * 20
+        self.semantic_threshold = semantic_threshold
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._semantic: Dict[str, Tuple[np.ndarray, List[str]]] = {}
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = 0
+        self.stats = {"hits": 0, "misses": 0, "semantic_hits": 0, "disk_hits": 0, "evictions": 0}
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache (created_at)")
+            self._db.commit()
+
+    def get(self, key: str, scope: str = "", vector: Optional[np.ndarray] = None) -> Any:
+        """
+        Cached value for key, or MISSING.
+        If a query vector is given and the exact key misses, the most similar
+        earlier query in the same scope is used when above the threshold.
+        """
+        value = self._lookup(key)
+        semantic = False
+        if value is MISSING and vector is not None:
+            value = self._semantic_lookup(scope, vector)
+            semantic = value is not MISSING
+        with self._lock:
+            if value is MISSING:
+                self.stats["misses"] += 1
+            else:
+                self.stats["hits"] += 1
+                if semantic:
+                    self.stats["semantic_hits"] += 1
+        return value
+
+    def _lookup(self, key: str) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    # Callers mutate parsed JSON (e.g. renumbering questions), so hand out copies
+                    return copy.deepcopy(entry[1])
+                del self._memory[key]
+                self.stats["evictions"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    value = json.loads(row[0])
+                    self._remember(key, copy.deepcopy(value), row[1])
+                    self.stats["disk_hits"] += 1
+                    return value
+            return MISSING
+
+    def _semantic_lookup(self, scope: str, vector: np.ndarray) -> Any:
+        with self._lock:
+            index = self._semantic.get(scope)
+        if index is None:
+            return MISSING
+        matrix, keys = index
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return MISSING
+        return self._lookup(keys[best])
+
+    def put(self, key: str, value: Any, scope: str = "", vector: Optional[np.ndarray] = None):
+        """Cache value under key; with a query vector it also becomes findable by similarity"""
+        now = time.time()
+        if vector is not None:
+            self._semantic_put(scope, vector, key)
+        with self._lock:
+            self._remember(key, copy.deepcopy(value), now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), now),
+                )
+                self._writes += 1
+                # Trim the disk tier every so often rather than on every write
+                if self._writes % 100 == 0:
+                    self._trim_disk(now)
+                self._db.commit()
+
+    def _remember(self, key: str, value: Any, created_at: float):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _trim_disk(self, now: float):
+        cursor = self._db.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.stats["evictions"] += cursor.rowcount
+        cursor = self._db.execute(
+            "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+        self.stats["evictions"] += cursor.rowcount
+
+    def _semantic_put(self, scope: str, vector: np.ndarray, key: str):
+        with self._lock:
+            matrix, keys = self._semantic.get(scope, (np.empty((0, vector.shape[0]), dtype=np.float32), []))
+            # Bounded per scope: keep the most recent max_entries queries
+            matrix = np.vstack([matrix, vector[None, :].astype(np.float32)])[-self.max_entries:]
+            keys = (keys + [key])[-self.max_entries:]
+            self._semantic[scope] = (matrix, keys)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._memory),
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
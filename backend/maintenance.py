@@ -0,0 +1,80 @@
+"""
+Lifecycle operations on stored documents.
+Usage:
+    python -m backend.maintenance list
+    python -m backend.maintenance delete <doc_hash>
+    python -m backend.maintenance evict [--ttl SECONDS]
+    python -m backend.maintenance compact
+A running server notices documents deleted here through the catalog and
+ingests them again on next use; its in-memory caches are not reached directly.
+"""
+
+import argparse
+import time
+
+from backend.catalog import catalog
+from backend.ingestion import registry
+from backend.question_bank import question_bank
+from backend.settings import DOC_TTL_SECONDS
+from backend.vector_store import forget_lexical_index, get_backend
+
+
+def delete_document(doc_hash: str):
+    """Remove a document's vectors, catalog entry, cached ingestion and lexical index, and banked questions"""
+    get_backend().delete_document(doc_hash)
+    catalog.remove(doc_hash)
+    registry.forget(doc_hash)
+    forget_lexical_index(doc_hash)
+    question_bank.forget(doc_hash)
+
+
+def evict_unused(ttl_seconds: int = DOC_TTL_SECONDS) -> list:
+    """Delete documents not used for ttl_seconds; returns their hashes"""
+    if ttl_seconds <= 0:
+        return []
+    evicted = catalog.unused_since(time.time() - ttl_seconds)
+    for doc_hash in evicted:
+        delete_document(doc_hash)
+    if evicted:
+        print(f"Evicted {len(evicted)} unused documents")
+    return evicted
+
+
+def compact(ttl_seconds: int = DOC_TTL_SECONDS) -> dict:
+    """Evict unused documents, then drop points of documents missing from the catalog"""
+    evicted = evict_unused(ttl_seconds)
+    keep = [doc["doc_hash"] for doc in catalog.all()]
+    if not keep:
+        # An empty keep list would match every point; an empty or fresh catalog is no reason to wipe the store
+        print("Catalog is empty; not dropping any points")
+        return {"evicted_documents": len(evicted), "dropped_points": 0}
+    dropped = get_backend().compact(keep)
+    return {"evicted_documents": len(evicted), "dropped_points": dropped}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m backend.maintenance", description="Manage stored documents")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="List catalogued documents")
+    delete = commands.add_parser("delete", help="Delete one document")
+    delete.add_argument("doc_hash")
+    evict = commands.add_parser("evict", help="Delete documents unused for longer than the TTL")
+    evict.add_argument("--ttl", type=int, default=DOC_TTL_SECONDS)
+    compact_parser = commands.add_parser("compact", help="Evict, drop uncatalogued points and merge shards")
+    compact_parser.add_argument("--ttl", type=int, default=DOC_TTL_SECONDS)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for doc in catalog.all():
+            last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(doc["last_used_at"]))
+            print(f"{doc['doc_hash']}  {doc['chunk_count']:6d} chunks  last used {last_used}  {doc['pdf_path']}")
+    elif args.command == "delete":
+        delete_document(args.doc_hash)
+    elif args.command == "evict":
+        evict_unused(args.ttl)
+    else:
+        print(compact(args.ttl))
+
+
+if __name__ == "__main__":
+    main()
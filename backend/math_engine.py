@@ -0,0 +1,192 @@
+"""
+Sandboxed SymPy execution.
+Equations and expressions from LLM output are parsed and solved in a pool of
+worker processes, each with an address-space cap and a per-task deadline; a
+task that overruns is interrupted inside its worker, and a worker that does
+not respond is killed with its pool. Results are cached by canonical form.
+"""
+
+import multiprocessing
+import re
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import List, Optional
+
+from backend.settings import MATH_CACHE_SIZE, MATH_MEMORY_MB, MATH_SIMPLIFY, MATH_TIMEOUT_SECONDS, MATH_WORKERS
+
+# Extra time the parent waits past the deadline before giving up on a worker
+_GRACE_SECONDS = 2.0
+
+
+def canonicalize(text: str) -> str:
+    """Normalize an LLM-written formula: strip markup, use ** for powers, collapse whitespace"""
+    text = text.strip().rstrip(".,;").strip("`$ ").rstrip(".,;")
+    text = text.replace("^", "**").replace("×", "*").replace("−", "-")
+    # Spacing around operators carries no meaning, so "x**2-4 = 0" and "x**2 - 4=0" share a cache entry
+    text = re.sub(r"\s*([=+\-*/(),<>])\s*", r"\1", text)
+    return " ".join(text.split())
+
+
+# Worker side
+
+def _init_worker(memory_mb: int):
+    if memory_mb > 0:
+        try:
+            import resource
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            print(f"Could not cap math worker memory: {e}")
+
+
+def _on_alarm(signum, frame):
+    raise TimeoutError("math task exceeded its deadline")
+
+
+@lru_cache(maxsize=256)
+def _parse(canonical: str):
+    """Expression for a canonical formula; "lhs = rhs" becomes lhs - rhs"""
+    import sympy as sp
+    if canonical.count("=") == 1 and "==" not in canonical:
+        lhs, rhs = canonical.split("=")
+        return sp.sympify(lhs) - sp.sympify(rhs)
+    return sp.sympify(canonical)
+
+
+def _run(op: str, canonical: str, simplify: bool, timeout: float) -> dict:
+    """Solve or evaluate one formula inside a worker, under a SIGALRM deadline"""
+    import sympy as sp
+    # Without SIGALRM (Windows) only the parent-side deadline applies
+    alarm = hasattr(signal, "setitimer")
+    if alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        expr = _parse(canonical)
+        result = {"latex": sp.latex(expr)}
+        if op == "solve":
+            free = sorted(expr.free_symbols, key=lambda s: s.name)
+            x = sp.Symbol('x')
+            variable = x if x in free or not free else free[0]
+            result["variable"] = str(variable)
+            result["solutions"] = [str(sol) for sol in sp.solve(expr, variable)]
+        else:
+            result["result"] = str(expr.evalf())
+        result["simplified"] = str(sp.simplify(expr)) if simplify else None
+        return result
+    except TimeoutError:
+        return {"error": "Timed out", "timeout": True}
+    except MemoryError:
+        return {"error": "Memory limit exceeded"}
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+# Parent side
+
+class MathEngine:
+    def __init__(self, workers: int = MATH_WORKERS, timeout: float = MATH_TIMEOUT_SECONDS,
+                 memory_mb: int = MATH_MEMORY_MB, cache_size: int = MATH_CACHE_SIZE):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.cache_size = cache_size
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._cache: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "timeouts": 0, "pool_restarts": 0}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # Never fork the API process itself: it may hold torch and HTTP client threads
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(method),
+                    initializer=_init_worker,
+                    initargs=(self.memory_mb,),
+                )
+            return self._pool
+
+    def _kill_pool(self, pool: ProcessPoolExecutor):
+        """Discard a pool with a stuck worker; the next task starts a fresh one"""
+        with self._pool_lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+            self.stats["pool_restarts"] += 1
+        for process in list(getattr(pool, "_processes", {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _cached(self, key: tuple) -> Optional[dict]:
+        with self._cache_lock:
+            result = self._cache.get(key)
+            if result is None:
+                self.stats["misses"] += 1
+                return None
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return dict(result)
+
+    def _remember(self, key: tuple, result: dict):
+        with self._cache_lock:
+            self._cache[key] = dict(result)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def run_many(self, op: str, formulas: List[str], simplify: bool = MATH_SIMPLIFY) -> List[dict]:
+        """Solve ("solve") or evaluate ("evaluate") formulas in parallel, sharing one deadline"""
+        keys = [(op, canonicalize(formula), simplify) for formula in formulas]
+        results = {key: self._cached(key) for key in keys}
+        pending = [key for key in dict.fromkeys(keys) if results[key] is None]
+        if pending:
+            pool = self._get_pool()
+            futures = {key: pool.submit(_run, *key, self.timeout) for key in pending}
+            deadline = time.monotonic() + self.timeout + _GRACE_SECONDS
+            stuck = False
+            for key, future in futures.items():
+                try:
+                    result = future.result(timeout=max(deadline - time.monotonic(), 0))
+                except (FutureTimeout, BrokenProcessPool) as e:
+                    stuck = True
+                    result = {"error": "Timed out" if isinstance(e, FutureTimeout) else "Math worker crashed",
+                              "timeout": True}
+                if result.pop("timeout", False):
+                    with self._cache_lock:
+                        self.stats["timeouts"] += 1
+                else:
+                    self._remember(key, result)
+                results[key] = result
+            if stuck:
+                self._kill_pool(pool)
+        return [dict(results[key], input=formula) for key, formula in zip(keys, formulas)]
+
+    def solve(self, equation: str, simplify: bool = MATH_SIMPLIFY) -> dict:
+        return self.run_many("solve", [equation], simplify)[0]
+
+    def evaluate(self, expression: str, simplify: bool = MATH_SIMPLIFY) -> dict:
+        return self.run_many("evaluate", [expression], simplify)[0]
+
+    def snapshot(self) -> dict:
+        with self._cache_lock:
+            return {**self.stats, "entries": len(self._cache)}
+
+    def shutdown(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+engine = MathEngine()
@@ -0,0 +1,287 @@
+"""
+Metrics and tracing.
+Counters, gauges and histograms rendered in the Prometheus text format at
+/metrics, plus `span`/`traced` to time graph nodes, LLM calls, vector store
+operations and tools. Each span records its latency, errors and in-flight
+count under (stage, name); when a request carries a trace ID, spans are also
+kept per trace so one slow request can be broken down by stage.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.settings import METRICS, TRACE_BUFFER_SIZE
+
+# Seconds; covers cache hits through multi-minute LLM-bound graph runs
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: tuple, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self._labels(key))} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_value(self, key: tuple, value) -> List[str]:
+        counts, total, count = value
+        labels = self._labels(key)
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+        self._collectors: "OrderedDict[str, Callable[[], dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help: str, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+    def register_collector(self, name: str, collect: Callable[[], dict]):
+        """
+        Expose an existing stats snapshot: every numeric leaf of collect()'s
+        (possibly nested) dict becomes edumind_<name>{stat="path_to_leaf"}.
+        """
+        self._collectors[name] = collect
+
+    def _render_collector(self, name: str, collect: Callable[[], dict]) -> List[str]:
+        metric = f"edumind_{name}"
+        try:
+            snapshot = collect()
+        except Exception as e:
+            print(f"Metrics collector {name} failed: {e}")
+            return []
+        lines = [f"# TYPE {metric} gauge"]
+        stack = [("", snapshot)]
+        while stack:
+            prefix, value = stack.pop()
+            if isinstance(value, dict):
+                stack.extend((f"{prefix}_{key}" if prefix else str(key), item) for key, item in value.items())
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f'{metric}{{stat="{_escape(prefix)}"}} {value}')
+            elif isinstance(value, bool):
+                lines.append(f'{metric}{{stat="{_escape(prefix)}"}} {int(value)}')
+        return lines
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        lines = [line for metric in metrics for line in metric.render()]
+        for name, collect in collectors:
+            lines.extend(self._render_collector(name, collect))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram("edumind_stage_seconds", "Latency of instrumented stages", ("stage", "name"))
+stage_errors = registry.counter("edumind_stage_errors_total", "Instrumented calls that raised", ("stage", "name"))
+stage_in_flight = registry.gauge("edumind_stage_in_flight", "Instrumented calls currently running", ("stage", "name"))
+
+
+# Tracing
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("edumind_trace_id", default=None)
+
+
+class _TraceBuffer:
+    """Spans of the most recent traces, oldest evicted first"""
+
+    def __init__(self, max_traces: int):
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace_id: str, span: dict):
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            if spans is None:
+                spans = self._traces[trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            spans.append(span)
+
+    def get(self, trace_id: str) -> Optional[List[dict]]:
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            return list(spans) if spans is not None else None
+
+
+_traces = _TraceBuffer(TRACE_BUFFER_SIZE)
+
+
+def set_trace_id(trace_id: Optional[str]):
+    """Attach a trace ID to the current context; returns a token for reset_trace_id"""
+    return _trace_id.set(trace_id)
+
+
+def reset_trace_id(token):
+    _trace_id.reset(token)
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def trace_spans(trace_id: str) -> Optional[List[dict]]:
+    return _traces.get(trace_id)
+
+
+# Instrumentation
+
+@contextmanager
+def span(stage: str, name: str):
+    """Time a block as (stage, name)"""
+    if not METRICS:
+        yield
+        return
+    stage_in_flight.inc(stage=stage, name=name)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        stage_errors.inc(stage=stage, name=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_in_flight.dec(stage=stage, name=name)
+        stage_seconds.observe(elapsed, stage=stage, name=name)
+        trace_id = _trace_id.get()
+        if trace_id:
+            _traces.add(trace_id, {"stage": stage, "name": name, "started_at": time.time() - elapsed,
+                                   "seconds": elapsed, "error": error})
+
+
+def traced(stage: str, name: str = None):
+    """Decorator form of span for functions, coroutines and async generators; name defaults to the function's"""
+    def decorate(func):
+        if not METRICS:
+            return func
+        label = name or func.__name__.removesuffix("_node")
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def agen_wrapper(*args, **kwargs):
+                with span(stage, label):
+                    async for item in func(*args, **kwargs):
+                        yield item
+            return agen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage, label):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage, label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,70 @@
+"""
+Page-parallel PDF text extraction.
+Page ranges are parsed in a shared process pool and page texts are yielded in
+document order as soon as each range finishes, so downstream chunking and
+embedding can start on early pages while later ones are still being parsed.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List
+
+import pypdf
+
+from backend.settings import EXTRACT_PAGES_PER_TASK, EXTRACT_PARALLEL_MIN_PAGES, EXTRACT_WORKERS
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Never fork the API process itself: it may hold torch and HTTP client threads
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _extract_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    """Extract pages [start, stop) in a worker process"""
+    reader = pypdf.PdfReader(pdf_path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def iter_page_texts(pdf_path: str, pages_per_task: int = EXTRACT_PAGES_PER_TASK) -> Iterator[str]:
+    """
+    Yield the text of every page in order.
+    Small documents are parsed inline; larger ones are split into page ranges
+    that run concurrently across the extraction pool.
+    """
+    reader = pypdf.PdfReader(pdf_path)
+    page_count = len(reader.pages)
+
+    if EXTRACT_WORKERS <= 1 or page_count < EXTRACT_PARALLEL_MIN_PAGES:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+
+    pool = _get_pool()
+    futures = [
+        pool.submit(_extract_range, pdf_path, start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def shutdown():
+    """Stop the extraction pool (used on application shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,171 @@
+"""
+Worksheet PDF rendering.
+Paragraph styles are built once per process. Output files are named by a hash
+of their content, so identical worksheets are rendered once and different
+ones never overwrite each other. Batches render in parallel across a process
+pool, one worksheet per task.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, TypedDict
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer
+
+from backend.settings import RENDER_WORKERS
+
+OUTPUT_DIR = os.path.join("static", "generated")
+
+
+class WorksheetSpec(TypedDict):
+    title: str
+    questions: List[dict]
+    answer_key: bool
+
+
+def _build_styles() -> dict:
+    sample = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle(
+            'CustomTitle',
+            parent=sample['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#4f46e5'),
+            spaceAfter=30,
+            alignment=TA_CENTER
+        ),
+        "instructions": ParagraphStyle(
+            'Instructions',
+            parent=sample['Normal'],
+            fontSize=10,
+            textColor=colors.grey,
+            spaceAfter=20
+        ),
+        "question": ParagraphStyle(
+            'Question',
+            parent=sample['Normal'],
+            fontSize=12,
+            spaceAfter=12,
+            leftIndent=20
+        ),
+        "normal": sample['Normal'],
+    }
+
+# Styles are immutable templates, shared by every render in this process
+STYLES = _build_styles()
+
+
+def worksheet_path(spec: WorksheetSpec, directory: str = OUTPUT_DIR) -> str:
+    """Content-addressed output path for a worksheet"""
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return os.path.join(directory, f"worksheet_{digest[:20]}.pdf")
+
+
+def _story(spec: WorksheetSpec) -> list:
+    styles = STYLES
+    story = [
+        Paragraph(escape(spec["title"]), styles["title"]),
+        Spacer(1, 0.2*inch),
+        Paragraph("Instructions: Answer all questions. Show your work for full credit.", styles["instructions"]),
+        Spacer(1, 0.3*inch),
+    ]
+
+    for i, q in enumerate(spec["questions"], 1):
+        # Question number and text; question text is escaped so "x < 3" is not read as markup
+        q_text = f"<b>Question {i}</b> ({escape(str(q.get('difficulty', 'Medium')))})<br/>{escape(str(q['text']))}"
+        story.append(Paragraph(q_text, styles["question"]))
+
+        # Options for MCQ
+        if q.get('options'):
+            for opt in q['options']:
+                story.append(Paragraph(f"○ {escape(str(opt))}", styles["normal"]))
+            story.append(Spacer(1, 0.1*inch))
+        else:
+            # Space for written answer
+            story.append(Spacer(1, 0.5*inch))
+
+        story.append(Spacer(1, 0.2*inch))
+
+    # Answer Key (on new page)
+    if spec["answer_key"]:
+        story.append(PageBreak())
+        story.append(Paragraph("Answer Key", styles["title"]))
+        story.append(Spacer(1, 0.2*inch))
+
+        for i, q in enumerate(spec["questions"], 1):
+            story.append(Paragraph(f"<b>{i}.</b> {escape(str(q.get('correct_answer', 'N/A')))}", styles["normal"]))
+            if q.get('explanation'):
+                story.append(Paragraph(f"<i>Explanation:</i> {escape(str(q['explanation']))}", styles["instructions"]))
+            story.append(Spacer(1, 0.15*inch))
+    return story
+
+
+def render_worksheet(spec: WorksheetSpec, output_path: str = None) -> str:
+    """Render one worksheet in this process; returns its path, reusing an identical earlier render"""
+    output_path = output_path or worksheet_path(spec)
+    if os.path.exists(output_path):
+        return output_path
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Build into a private temp file so concurrent renders never expose a partial PDF
+    temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    doc = SimpleDocTemplate(temp_path, pagesize=A4,
+                            rightMargin=72, leftMargin=72,
+                            topMargin=72, bottomMargin=18)
+    try:
+        doc.build(_story(spec))
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Never fork the API process itself: it may hold torch and HTTP client threads
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def render_worksheets(specs: List[WorksheetSpec]) -> List[str]:
+    """Render a batch of worksheets, in parallel when there is more than one to do"""
+    paths = [worksheet_path(spec) for spec in specs]
+    # Identical specs in one batch, and worksheets rendered before, are not rendered again
+    pending = {path: spec for path, spec in zip(paths, specs) if not os.path.exists(path)}
+    if RENDER_WORKERS <= 1 or len(pending) <= 1:
+        for path, spec in pending.items():
+            render_worksheet(spec, path)
+        return paths
+
+    pool = _get_pool()
+    futures = [pool.submit(render_worksheet, spec, path) for path, spec in pending.items()]
+    for future in futures:
+        future.result()
+    return paths
+
+
+def shutdown():
+    """Stop the rendering pool (used on application shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,177 @@
+"""
+Plot and diagram rendering service.
+Each render draws on its own matplotlib Figure (no global pyplot state), so
+concurrent requests cannot interfere. Parsed and lambdified expressions and
+finished images are kept in LRU caches, and renders run on a bounded thread
+pool so a burst of plots cannot occupy every request worker.
+"""
+
+import base64
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+import sympy as sp
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+
+from backend.settings import PLOT_DPI, PLOT_FUNCTION_CACHE_SIZE, PLOT_IMAGE_CACHE_SIZE, PLOT_WORKERS
+
+MIME_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+_pool = ThreadPoolExecutor(max_workers=PLOT_WORKERS, thread_name_prefix="plot")
+
+
+class _ImageCache:
+    """Thread-safe LRU of rendered images"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: tuple):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return dict(result)
+
+    def put(self, key: tuple, result: dict):
+        with self._lock:
+            self._entries[key] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries)}
+
+
+_images = _ImageCache(PLOT_IMAGE_CACHE_SIZE)
+
+
+def _canonical(expression: str) -> str:
+    return " ".join(expression.split())
+
+
+@lru_cache(maxsize=PLOT_FUNCTION_CACHE_SIZE)
+def _compile(expression: str):
+    """Parse and lambdify an expression in x once; returns (function, latex)"""
+    x = sp.symbols('x')
+    expr = sp.sympify(expression)
+    return sp.lambdify(x, expr, 'numpy'), sp.latex(expr)
+
+
+def _encode(fig: Figure, fmt: str) -> dict:
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, dpi=PLOT_DPI, bbox_inches='tight')
+    return {
+        "image_base64": base64.b64encode(buf.getvalue()).decode(),
+        "format": fmt,
+        "mime_type": MIME_TYPES[fmt],
+    }
+
+
+def _render_function(expression: str, x_range: Tuple[float, float], title: str, fmt: str) -> dict:
+    f, expr_latex = _compile(expression)
+    x_vals = np.linspace(x_range[0], x_range[1], 400)
+    # Constants lambdify to scalars; broadcast them across the x axis
+    y_vals = np.broadcast_to(f(x_vals), x_vals.shape)
+
+    fig = Figure(figsize=(8, 6))
+    ax = fig.add_subplot()
+    ax.plot(x_vals, y_vals, 'b-', linewidth=2)
+    ax.grid(True, alpha=0.3)
+    ax.set_xlabel('x', fontsize=12)
+    ax.set_ylabel('f(x)', fontsize=12)
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.axhline(y=0, color='k', linewidth=0.5)
+    ax.axvline(x=0, color='k', linewidth=0.5)
+    return {**_encode(fig, fmt), "function": expression, "latex": expr_latex}
+
+
+def _render_flowchart(steps: Tuple[str, ...], title: str, fmt: str) -> dict:
+    fig = Figure(figsize=(8, len(steps) * 1.5))
+    ax = fig.add_subplot()
+    ax.set_xlim(0, 10)
+    ax.set_ylim(0, len(steps) * 2)
+    ax.axis('off')
+
+    # Title
+    ax.text(5, len(steps) * 2 - 0.5, title, ha='center', va='top', fontsize=16, fontweight='bold')
+
+    # Draw boxes and arrows
+    for i, step in enumerate(steps):
+        y_pos = len(steps) * 2 - (i + 1) * 2
+        ax.add_patch(Rectangle((2, y_pos - 0.4), 6, 0.8, facecolor='lightblue', edgecolor='black', linewidth=2))
+        ax.text(5, y_pos, step, ha='center', va='center', fontsize=11, wrap=True)
+        # Arrow to next step
+        if i < len(steps) - 1:
+            ax.arrow(5, y_pos - 0.5, 0, -0.9, head_width=0.3, head_length=0.2, fc='black', ec='black')
+    return {**_encode(fig, fmt), "steps": list(steps)}
+
+
+_inflight: Dict[tuple, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def _cached_render(key: tuple, render, *args) -> dict:
+    result = _images.get(key)
+    if result is not None:
+        return result
+    # Concurrent requests for the same image share one render
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = _pool.submit(render, *args)
+    try:
+        result = future.result()
+        if owner:
+            _images.put(key, result)
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        if owner:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+    return dict(result)
+
+
+def plot_function(expression: str, x_range=(-10, 10), title: str = "Function Plot", fmt: str = "png") -> dict:
+    """
+    Plot an expression in x. Returns image_base64 with its format and
+    mime_type plus the function's LaTeX, or {"error": ...}.
+    """
+    if fmt not in MIME_TYPES:
+        return {"error": f"Unsupported format: {fmt}"}
+    expression = _canonical(expression)
+    x_range = (float(x_range[0]), float(x_range[1]))
+    return _cached_render(("function", expression, x_range, title, fmt), _render_function, expression, x_range, title, fmt)
+
+
+def flowchart(steps: List[str], title: str = "Flowchart", fmt: str = "png") -> dict:
+    """Render a simple vertical flowchart of steps"""
+    if fmt not in MIME_TYPES:
+        return {"error": f"Unsupported format: {fmt}"}
+    steps = tuple(steps)
+    return _cached_render(("flowchart", steps, title, fmt), _render_flowchart, steps, title, fmt)
+
+
+def cache_stats() -> dict:
+    compiled = _compile.cache_info()
+    return {"images": _images.snapshot(), "functions": {"hits": compiled.hits, "misses": compiled.misses, "entries": compiled.currsize}}
+
+
+def shutdown():
+    _pool.shutdown(wait=False, cancel_futures=True)
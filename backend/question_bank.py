@@ -0,0 +1,285 @@
+"""
+Per-document question bank.
+Quiz questions are generated once per document, in the background after
+ingestion, and stored in SQLite indexed by topic, difficulty and type. Quiz
+starts sample from the bank with a per-quiz shuffle instead of calling the
+LLM; a slice that runs low is topped up in the background.
+"""
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from backend.settings import (GENERATION_WORKERS, MCQ_BATCH_SIZE, QUESTION_BANK_DB, QUESTION_BANK_LOW_WATER,
+                              QUESTION_BANK_SIZE, TOPIC_CONTEXT_CHARS)
+
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+
+_DIFFICULTY_GUIDE = {
+    "Easy": "Basic recall and understanding questions",
+    "Medium": "Application and analysis questions",
+    "Hard": "Complex synthesis and evaluation questions",
+}
+
+
+def normalize_difficulty(difficulty) -> str:
+    """The canonical spelling of a difficulty level; ValueError for anything outside DIFFICULTIES"""
+    for level in DIFFICULTIES:
+        if str(difficulty or "").strip().lower() == level.lower():
+            return level
+    raise ValueError(f"Unknown difficulty {difficulty!r}; expected one of {', '.join(DIFFICULTIES)}")
+
+
+# Existing questions listed in a top-up prompt so the LLM writes new ones
+_AVOID_EXAMPLES = 15
+
+
+def question_key(doc_hash: str, text: str) -> str:
+    """Stable ID of a question within a document; rewordings differing only in case or spacing collide"""
+    normalized = " ".join(str(text).lower().split())
+    return hashlib.sha256(f"{doc_hash}\x00{normalized}".encode("utf-8")).hexdigest()[:24]
+
+
+def _valid(question) -> bool:
+    """Only well-formed MCQs whose answer is one of the options are worth reusing"""
+    if not isinstance(question, dict) or not question.get("text"):
+        return False
+    options = question.get("options")
+    if question.get("type", "MCQ") != "MCQ":
+        return bool(question.get("correct_answer"))
+    if not isinstance(options, list) or len(options) < 2:
+        return False
+    answer = str(question.get("correct_answer", "")).strip().lower()
+    return answer in (str(option).strip().lower() for option in options)
+
+
+class QuestionBank:
+    def __init__(self, db_path: str, size: int = QUESTION_BANK_SIZE, low_water: int = QUESTION_BANK_LOW_WATER):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.size = size
+        self.low_water = low_water
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS questions (question_key TEXT PRIMARY KEY, doc_hash TEXT NOT NULL, "
+            "topic TEXT NOT NULL, difficulty TEXT NOT NULL, type TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS questions_slice ON questions (doc_hash, difficulty, type, topic)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        # (doc_hash, difficulty, type) -> topic -> questions, for documents loaded from SQLite
+        self._slices: Dict[tuple, Dict[str, List[dict]]] = {}
+        self._loaded = set()
+        self._pending = set()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-bank")
+        self.stats = {"served": 0, "misses": 0, "generated": 0}
+
+    def _index(self, doc_hash: str, question: dict):
+        slice_key = (doc_hash, question["difficulty"], question["type"])
+        self._slices.setdefault(slice_key, {}).setdefault(question["topic"], []).append(question)
+
+    def _load(self, doc_hash: str):
+        with self._lock:
+            if doc_hash in self._loaded:
+                return
+            rows = self._db.execute("SELECT question_key, data FROM questions WHERE doc_hash = ?", (doc_hash,)).fetchall()
+            for key, data in rows:
+                self._index(doc_hash, dict(json.loads(data), bank_id=key))
+            self._loaded.add(doc_hash)
+
+    def add(self, doc_hash: str, questions: Iterable[dict]) -> int:
+        """Store valid, not yet banked questions; returns how many were added"""
+        self._load(doc_hash)
+        now = time.time()
+        added = 0
+        with self._lock:
+            for question in questions:
+                if not _valid(question):
+                    continue
+                question = {k: v for k, v in question.items() if k not in ("id", "bank_id")}
+                try:
+                    question["difficulty"] = normalize_difficulty(question.get("difficulty"))
+                except ValueError:
+                    # Filing it under another level would mix it into that slice
+                    continue
+                question["type"] = question.get("type") or "MCQ"
+                question["topic"] = question.get("topic") or "General Content"
+                key = question_key(doc_hash, question["text"])
+                inserted = self._db.execute(
+                    "INSERT OR IGNORE INTO questions (question_key, doc_hash, topic, difficulty, type, data, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, doc_hash, question["topic"], question["difficulty"], question["type"], json.dumps(question), now),
+                ).rowcount
+                if inserted:
+                    self._index(doc_hash, dict(question, bank_id=key))
+                    added += 1
+            self._db.commit()
+        return added
+
+    def count(self, doc_hash: str, difficulty: str, qtype: str = "MCQ") -> int:
+        self._load(doc_hash)
+        with self._lock:
+            return sum(len(questions) for questions in self._slices.get((doc_hash, difficulty, qtype), {}).values())
+
+    def sample(self, doc_hash: str, num_questions: int, difficulty: str, qtype: str = "MCQ",
+               rng: random.Random = None, focus_topics: List[str] = ()) -> Optional[List[dict]]:
+        """
+        num_questions banked questions spread across topics, in a fresh random
+        order per call; focus_topics get two questions per round. None when the
+        slice is too small to serve the quiz. Raises ValueError for an unknown difficulty.
+        """
+        difficulty = normalize_difficulty(difficulty)
+        self._load(doc_hash)
+        with self._lock:
+            by_topic = {topic: list(questions) for topic, questions in self._slices.get((doc_hash, difficulty, qtype), {}).items()}
+        available = sum(len(questions) for questions in by_topic.values())
+        if available < max(num_questions, self.low_water):
+            self.schedule(doc_hash, [difficulty], minimum=num_questions)
+        if available < num_questions or num_questions <= 0:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        rng = rng or random.Random()
+        topics = list(by_topic)
+        rng.shuffle(topics)
+        for topic in topics:
+            rng.shuffle(by_topic[topic])
+        focus = [topic for topic in focus_topics if topic in by_topic]
+        topics = focus + [topic for topic in topics if topic not in focus]
+        # Deal questions topic by topic in turn so a short quiz still covers the document
+        picked = []
+        while len(picked) < num_questions:
+            for topic in topics:
+                for _ in range(2 if topic in focus else 1):
+                    if by_topic[topic] and len(picked) < num_questions:
+                        picked.append(by_topic[topic].pop())
+        rng.shuffle(picked)
+        with self._lock:
+            self.stats["served"] += 1
+        return [dict(question, id=i + 1) for i, question in enumerate(picked)]
+
+    def schedule(self, doc_hash: str, difficulties: Iterable[str] = DIFFICULTIES, minimum: int = 0):
+        """Generate questions in the background until each slice holds max(size, minimum)"""
+        for difficulty in [normalize_difficulty(d) for d in difficulties]:
+            with self._lock:
+                if (doc_hash, difficulty) in self._pending:
+                    continue
+                self._pending.add((doc_hash, difficulty))
+            self._pool.submit(self._fill, doc_hash, difficulty, max(self.size, minimum))
+
+    def _fill(self, doc_hash: str, difficulty: str, target: int):
+        try:
+            missing = target - self.count(doc_hash, difficulty)
+            if missing <= 0:
+                return
+            doc = _document(doc_hash)
+            if doc is None:
+                return
+            added = self.add(doc_hash, _generate(doc, difficulty, missing, self._texts(doc_hash, difficulty)))
+            with self._lock:
+                self.stats["generated"] += added
+            print(f"Question bank: added {added} {difficulty} questions for {doc_hash[:12]}")
+        except Exception as e:
+            print(f"Question bank generation failed for {doc_hash[:12]}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard((doc_hash, difficulty))
+
+    def _texts(self, doc_hash: str, difficulty: str) -> Dict[str, List[str]]:
+        with self._lock:
+            topics = self._slices.get((doc_hash, difficulty, "MCQ"), {})
+            return {topic: [q["text"] for q in questions] for topic, questions in topics.items()}
+
+    def forget(self, doc_hash: str):
+        """Drop a document's questions"""
+        with self._lock:
+            self._db.execute("DELETE FROM questions WHERE doc_hash = ?", (doc_hash,))
+            self._db.commit()
+            for slice_key in [key for key in self._slices if key[0] == doc_hash]:
+                del self._slices[slice_key]
+            self._loaded.discard(doc_hash)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            banked = sum(len(qs) for topics in self._slices.values() for qs in topics.values())
+            return {**self.stats, "loaded_documents": len(self._loaded), "loaded_questions": banked,
+                    "pending": len(self._pending)}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _document(doc_hash: str):
+    """The ingested document, re-ingesting from its catalogued path if it left the registry"""
+    from backend.catalog import catalog
+    from backend.ingestion import registry
+    doc = registry.get(doc_hash)
+    if doc is None:
+        entry = catalog.get(doc_hash)
+        if entry is None or not os.path.exists(entry["pdf_path"]):
+            return None
+        doc = registry.ingest(entry["pdf_path"])
+    return doc if doc["chunks"] else None
+
+
+def _generate_batch(topic: str, context: str, difficulty: str, count: int, avoid: List[str]) -> List[dict]:
+    from backend.llm import generate_json
+    focus = "" if topic == "General Content" else f"\n    Focus on the topic: {topic}\n"
+    # Listing banked questions keeps top-ups from repeating them (and from hitting the LLM cache)
+    existing = "".join(f"\n    - {text}" for text in avoid[-_AVOID_EXAMPLES:])
+    avoid_block = f"\n    Do not repeat these existing questions:{existing}\n" if existing else ""
+    prompt = f"""
+    Based on the following context from the uploaded document, generate {count} multiple choice questions.
+    Difficulty level: {difficulty} ({_DIFFICULTY_GUIDE[difficulty]})
+    {focus}{avoid_block}
+    Context from uploaded PDF:
+    {context}
+
+    Output format (JSON array):
+    [
+        {{
+            "text": "Question text",
+            "options": ["Option A", "Option B", "Option C", "Option D"],
+            "correct_answer": "Correct Option Text (must match one of the options exactly)",
+            "explanation": "Why this is correct"
+        }}
+    ]
+
+    IMPORTANT: The correct_answer must EXACTLY match one of the options in the options array.
+    Generate questions ONLY from the provided context, not from general knowledge.
+    """
+    response = generate_json(prompt)
+    if not isinstance(response, list):
+        return []
+    # Index under the segmented topic name so topic lookups match across documents' quizzes
+    return [dict(q, topic=topic, difficulty=difficulty, type="MCQ") for q in response if isinstance(q, dict)]
+
+
+def _generate(doc, difficulty: str, count: int, existing: Dict[str, List[str]]) -> List[dict]:
+    """Generate about `count` questions spread over the document's topics, MCQ_BATCH_SIZE per LLM call"""
+    from backend.topics import segment_topics
+    topics = segment_topics(doc["chunks"], doc["embeddings"])
+    batches = []
+    for t, topic in enumerate(topics):
+        topic_count = count // len(topics) + (1 if t < count % len(topics) else 0)
+        parts = -(-topic_count // MCQ_BATCH_SIZE)
+        for part in range(parts):
+            # Sub-batches of one topic see different central chunks, as worksheet generation does
+            selected = topic["representatives"][part::parts] or topic["representatives"]
+            context = "\n\n".join(selected)[:TOPIC_CONTEXT_CHARS]
+            batch = topic_count // parts + (1 if part < topic_count % parts else 0)
+            batches.append((topic["name"], context, difficulty, batch, existing.get(topic["name"], [])))
+    if not batches:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(batches), GENERATION_WORKERS)) as pool:
+        return [q for questions in pool.map(lambda args: _generate_batch(*args), batches) for q in questions]
+
+
+question_bank = QuestionBank(QUESTION_BANK_DB)
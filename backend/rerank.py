@@ -0,0 +1,35 @@
+"""
+Optional cross-encoder reranking of retrieved chunks.
+Candidates are scored in fused order, a few at a time, until the latency
+budget runs out; the scored prefix is reordered and the rest keep their order.
+"""
+
+import time
+from typing import List
+
+from backend.resources import resources
+from backend.settings import RERANK_BATCH_SIZE, RERANK_BUDGET_MS, RERANK_MODEL_NAME
+
+
+def _create_reranker():
+    # Imported here so that importing this module does not pull in torch
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(RERANK_MODEL_NAME)
+
+resources.register("reranker", _create_reranker, warm=lambda model: model.predict([("warm", "up")]))
+
+
+def rerank(query: str, payloads: List[dict], budget_ms: float = RERANK_BUDGET_MS) -> List[dict]:
+    """Reorder payloads by cross-encoder relevance to query, within budget_ms"""
+    if len(payloads) < 2:
+        return payloads
+    model = resources.get("reranker")
+    deadline = time.perf_counter() + budget_ms / 1000
+    scores: List[float] = []
+    for start in range(0, len(payloads), RERANK_BATCH_SIZE):
+        batch = payloads[start:start + RERANK_BATCH_SIZE]
+        scores.extend(float(s) for s in model.predict([(query, p["text"]) for p in batch], show_progress_bar=False))
+        if time.perf_counter() > deadline:
+            break
+    scored = sorted(range(len(scores)), key=lambda i: -scores[i])
+    return [payloads[i] for i in scored] + payloads[len(scores):]
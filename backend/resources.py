@@ -0,0 +1,75 @@
+"""
+Registry of heavyweight shared resources (embedding model, vector DB client).
+Resources are built lazily on first use, can be warmed up explicitly at
+application startup, and record how long construction and warm-up took.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class _Resource:
+    def __init__(self, factory: Callable, warm: Optional[Callable], close: Optional[Callable]):
+        self.factory = factory
+        self.warm = warm
+        self.close = close
+        self.instance = None
+        self.lock = threading.Lock()
+        self.timings: Dict[str, float] = {}
+
+
+class ResourceRegistry:
+    def __init__(self):
+        self._resources: Dict[str, _Resource] = {}
+
+    def register(self, name: str, factory: Callable, warm: Callable = None, close: Callable = None):
+        """
+        Declare a resource. factory() builds it; warm(instance) and close(instance)
+        are optional lifecycle hooks run by warm_up() and close_all().
+        """
+        self._resources[name] = _Resource(factory, warm, close)
+
+    def get(self, name: str):
+        """The resource instance, constructing it on first use"""
+        resource = self._resources[name]
+        if resource.instance is None:
+            with resource.lock:
+                if resource.instance is None:
+                    started = time.perf_counter()
+                    resource.instance = resource.factory()
+                    resource.timings["construct_seconds"] = time.perf_counter() - started
+                    print(f"Loaded {name} in {resource.timings['construct_seconds']:.2f}s")
+        return resource.instance
+
+    def warm_up(self, names=None):
+        """Construct resources and run their warm hooks (e.g. a dummy forward pass)"""
+        for name in names or list(self._resources):
+            resource = self._resources[name]
+            instance = self.get(name)
+            if resource.warm is not None:
+                started = time.perf_counter()
+                try:
+                    resource.warm(instance)
+                except Exception as e:
+                    print(f"Warm-up of {name} failed: {e}")
+                resource.timings["warm_seconds"] = time.perf_counter() - started
+
+    def close_all(self):
+        for name, resource in self._resources.items():
+            with resource.lock:
+                if resource.instance is not None and resource.close is not None:
+                    try:
+                        resource.close(resource.instance)
+                    except Exception as e:
+                        print(f"Closing {name} failed: {e}")
+                resource.instance = None
+
+    def timings(self) -> dict:
+        return {
+            name: {"loaded": resource.instance is not None, **resource.timings}
+            for name, resource in self._resources.items()
+        }
+
+
+resources = ResourceRegistry()
@@ -0,0 +1,190 @@
+"""
+Server-side quiz sessions.
+A session holds the generated questions (answer keys never leave the server)
+and accumulates answers and running totals as they arrive, so grading is a
+dictionary lookup and finishing a quiz reads precomputed aggregates.
+Sessions live in an in-process LRU with TTL, optionally written through to
+SQLite so they survive restarts.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from backend.settings import SESSION_CACHE_SIZE, SESSION_DB, SESSION_TTL_SECONDS
+
+# Fields a client may see before answering
+_PUBLIC_FIELDS = ("id", "text", "options", "difficulty", "type", "topic")
+
+
+def normalize_answer(answer: str) -> str:
+    """Compare answers without an "A. " option label, case or surrounding whitespace"""
+    return re.sub(r"^[A-D]\.\s*", "", str(answer or "").strip(), flags=re.IGNORECASE).strip().lower()
+
+
+class QuizSession:
+    def __init__(self, session_id: str, questions: List[dict], metadata: dict, created_at: float = None):
+        self.session_id = session_id
+        self.questions: Dict[str, dict] = {str(q["id"]): q for q in questions}
+        self.order = [str(q["id"]) for q in questions]
+        self.metadata = metadata
+        self.created_at = created_at or time.time()
+        self.answers: Dict[str, dict] = {}
+        # Running totals, updated per answer
+        self.correct = 0
+        self.total_time = 0
+        self.mistakes: Dict[str, int] = {}
+
+    def public_questions(self) -> List[dict]:
+        return [{field: self.questions[qid].get(field) for field in _PUBLIC_FIELDS} for qid in self.order]
+
+    def _apply(self, answer: dict):
+        self.correct += answer["is_correct"]
+        self.total_time += answer["time_taken"]
+        if not answer["is_correct"]:
+            topic = answer["topic"]
+            self.mistakes[topic] = self.mistakes.get(topic, 0) + 1
+
+    def record_answer(self, question_id, user_answer: str, time_taken: int) -> Optional[dict]:
+        """
+        Grade an answer and fold it into the totals. A question locks on its
+        first answer, since the reply reveals the key; answering again returns
+        the stored result with already_answered set and changes nothing.
+        """
+        question = self.questions.get(str(question_id))
+        if question is None:
+            return None
+        answer = self.answers.get(str(question_id))
+        already_answered = answer is not None
+        if not already_answered:
+            answer = {
+                "user_answer": user_answer,
+                "is_correct": normalize_answer(user_answer) == normalize_answer(question.get("correct_answer")),
+                "time_taken": int(time_taken or 0),
+                "topic": question.get("topic") or "Unknown",
+            }
+            self.answers[str(question_id)] = answer
+            self._apply(answer)
+        return {
+            "is_correct": answer["is_correct"],
+            "correct_answer": question.get("correct_answer"),
+            "explanation": question.get("explanation", ""),
+            "already_answered": already_answered,
+        }
+
+    def summary(self) -> dict:
+        total = len(self.answers)
+        weak_areas = sorted(self.mistakes.items(), key=lambda item: item[1], reverse=True)
+        return {
+            "score": self.correct / total * 100 if total else 0,
+            "correct": self.correct,
+            "total": total,
+            "time_taken": self.total_time,
+            "weak_areas": [{"topic": topic, "mistakes": count} for topic, count in weak_areas[:3]],
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "questions": [self.questions[qid] for qid in self.order],
+            "metadata": self.metadata,
+            "created_at": self.created_at,
+            "answers": self.answers,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuizSession":
+        session = cls(data["session_id"], data["questions"], data["metadata"], data["created_at"])
+        for question_id, answer in data["answers"].items():
+            session.answers[question_id] = answer
+            session._apply(answer)
+        return session
+
+
+class SessionStore:
+    """LRU + TTL store of quiz sessions with an optional SQLite write-through tier"""
+
+    def __init__(self, max_entries: int = SESSION_CACHE_SIZE, ttl_seconds: int = SESSION_TTL_SECONDS,
+                 db_path: str = SESSION_DB):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()  # id -> (last_used, session)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            if os.path.dirname(db_path):
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS quiz_sessions (session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS quiz_sessions_updated ON quiz_sessions (updated_at)")
+            self._db.commit()
+
+    def create(self, questions: List[dict], **metadata) -> QuizSession:
+        session = QuizSession(uuid.uuid4().hex, questions, metadata)
+        with self._lock:
+            self._remember(session, time.time())
+            self._persist(session)
+        return session
+
+    def get(self, session_id: str) -> Optional[QuizSession]:
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._sessions[session_id] = (now, entry[1])
+                    self._sessions.move_to_end(session_id)
+                    return entry[1]
+                del self._sessions[session_id]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT data, updated_at FROM quiz_sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    session = QuizSession.from_dict(json.loads(row[0]))
+                    self._remember(session, now)
+                    return session
+            return None
+
+    def record_answer(self, session_id: str, question_id, user_answer: str, time_taken: int) -> Optional[dict]:
+        """Grade one answer; None if the session or question is unknown"""
+        session = self.get(session_id)
+        if session is None:
+            return None
+        with self._lock:
+            result = session.record_answer(question_id, user_answer, time_taken)
+            if result is not None and not result["already_answered"]:
+                self._persist(session)
+        return result
+
+    def _remember(self, session: QuizSession, now: float):
+        self._sessions[session.session_id] = (now, session)
+        self._sessions.move_to_end(session.session_id)
+        while len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+
+    def _persist(self, session: QuizSession):
+        if self._db is None:
+            return
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO quiz_sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+            (session.session_id, json.dumps(session.to_dict()), now),
+        )
+        self._db.execute("DELETE FROM quiz_sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+        self._db.commit()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._sessions)}
+
+
+session_store = SessionStore()
@@ -0,0 +1,166 @@
+"""
+Runtime tuning knobs for EduMind Agent.
+Secrets live in backend/config.py; everything here has a sensible default
+and can be overridden from the environment.
+"""
+
+import os
+
+
+def _int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def _bool(name: str, default: bool) -> bool:
+    return os.getenv(name, "1" if default else "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+# Ingestion
+INGEST_CACHE_SIZE = _int("EDUMIND_INGEST_CACHE_SIZE", 64)
+
+# Uploads: largest accepted PDF, bytes hashed and written per block, whether
+# an upload is ingested (extracted and embedded) in the background as soon as
+# it lands, and the threads reserved for that background ingestion
+UPLOAD_MAX_BYTES = _int("EDUMIND_UPLOAD_MAX_BYTES", 50 * 1024 * 1024)
+UPLOAD_CHUNK_BYTES = _int("EDUMIND_UPLOAD_CHUNK_BYTES", 1024 * 1024)
+UPLOAD_PREINGEST = _bool("EDUMIND_UPLOAD_PREINGEST", True)
+UPLOAD_INGEST_WORKERS = _int("EDUMIND_UPLOAD_INGEST_WORKERS", 2)
+
+# PDF extraction: worker processes, pages per pool task, and the page count
+# below which a document is parsed inline rather than in the pool
+EXTRACT_WORKERS = _int("EDUMIND_EXTRACT_WORKERS", min(4, os.cpu_count() or 1))
+EXTRACT_PAGES_PER_TASK = _int("EDUMIND_EXTRACT_PAGES_PER_TASK", 8)
+EXTRACT_PARALLEL_MIN_PAGES = _int("EDUMIND_EXTRACT_PARALLEL_MIN_PAGES", 16)
+
+# Document lifecycle: SQLite catalog of stored documents, how often a use is
+# written back, how long an unused document's vectors are kept (0 keeps
+# forever), and how often the server sweeps for such documents
+CATALOG_DB = os.getenv("EDUMIND_CATALOG_DB", os.path.join("data", "catalog.db"))
+CATALOG_TOUCH_INTERVAL_SECONDS = _int("EDUMIND_CATALOG_TOUCH_INTERVAL_SECONDS", 300)
+DOC_TTL_SECONDS = _int("EDUMIND_DOC_TTL_SECONDS", 30 * 86400)
+DOC_EVICT_INTERVAL_SECONDS = _int("EDUMIND_DOC_EVICT_INTERVAL_SECONDS", 3600)
+
+# Worksheet PDF rendering: worker processes for rendering batches of worksheets
+RENDER_WORKERS = _int("EDUMIND_RENDER_WORKERS", min(4, os.cpu_count() or 1))
+
+# Plot rendering: render threads, raster resolution, chat plot format (png or
+# svg), and LRU sizes for compiled expressions and rendered images
+PLOT_WORKERS = _int("EDUMIND_PLOT_WORKERS", 2)
+PLOT_DPI = _int("EDUMIND_PLOT_DPI", 150)
+PLOT_FORMAT = os.getenv("EDUMIND_PLOT_FORMAT", "png").lower()
+PLOT_FUNCTION_CACHE_SIZE = _int("EDUMIND_PLOT_FUNCTION_CACHE_SIZE", 256)
+PLOT_IMAGE_CACHE_SIZE = _int("EDUMIND_PLOT_IMAGE_CACHE_SIZE", 128)
+
+# Math tools: SymPy worker processes, per-task deadline, address-space cap per
+# worker (0 disables), result cache size, and whether to also run simplify()
+MATH_WORKERS = _int("EDUMIND_MATH_WORKERS", 2)
+MATH_TIMEOUT_SECONDS = _float("EDUMIND_MATH_TIMEOUT_SECONDS", 5)
+MATH_MEMORY_MB = _int("EDUMIND_MATH_MEMORY_MB", 512)
+MATH_CACHE_SIZE = _int("EDUMIND_MATH_CACHE_SIZE", 512)
+MATH_SIMPLIFY = _bool("EDUMIND_MATH_SIMPLIFY", False)
+
+# Chunking: target chunk size and overlap in approximate tokens (words and
+# punctuation); chunks smaller than CHUNK_MIN_TOKENS are dropped as noise
+CHUNK_TOKENS = _int("EDUMIND_CHUNK_TOKENS", 200)
+CHUNK_OVERLAP_TOKENS = _int("EDUMIND_CHUNK_OVERLAP_TOKENS", 40)
+CHUNK_MIN_TOKENS = _int("EDUMIND_CHUNK_MIN_TOKENS", 5)
+
+# Embedding: chunks encoded per forward pass and points sent per Qdrant upsert
+EMBED_BATCH_SIZE = _int("EDUMIND_EMBED_BATCH_SIZE", 64)
+
+# Retrieval: "hybrid" fuses BM25 and dense hits by reciprocal rank fusion
+# (RRF_K damps rank differences), "dense" is vector search only. Fusion and
+# reranking consider RETRIEVAL_CANDIDATES hits from each retriever.
+RETRIEVAL_MODE = os.getenv("EDUMIND_RETRIEVAL_MODE", "hybrid").lower()
+RETRIEVAL_CANDIDATES = _int("EDUMIND_RETRIEVAL_CANDIDATES", 20)
+RRF_K = _int("EDUMIND_RRF_K", 60)
+# Query embeddings kept in an LRU keyed on normalized query text
+QUERY_CACHE_SIZE = _int("EDUMIND_QUERY_CACHE_SIZE", 1024)
+
+# Cross-encoder reranking of fused candidates: off by default; candidates are
+# scored RERANK_BATCH_SIZE at a time until RERANK_BUDGET_MS is spent
+RERANK = _bool("EDUMIND_RERANK", False)
+RERANK_MODEL_NAME = os.getenv("EDUMIND_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BUDGET_MS = _float("EDUMIND_RERANK_BUDGET_MS", 150)
+RERANK_BATCH_SIZE = _int("EDUMIND_RERANK_BATCH_SIZE", 8)
+
+# API: threads available for blocking graph runs and retrieval called from request handlers
+GRAPH_WORKERS = _int("EDUMIND_GRAPH_WORKERS", 8)
+
+# Background jobs: concurrent graph runs, and how long finished jobs stay pollable
+JOB_WORKERS = _int("EDUMIND_JOB_WORKERS", 4)
+JOB_TTL_SECONDS = _int("EDUMIND_JOB_TTL_SECONDS", 3600)
+
+# Question generation: MCQs requested per LLM call, and concurrent calls per worksheet
+MCQ_BATCH_SIZE = _int("EDUMIND_MCQ_BATCH_SIZE", 10)
+GENERATION_WORKERS = _int("EDUMIND_GENERATION_WORKERS", 4)
+
+# Question bank: quiz questions generated once per document in the background
+# after ingestion, QUESTION_BANK_SIZE per difficulty, kept in SQLite. A slice
+# (document, difficulty, type) holding fewer than QUESTION_BANK_LOW_WATER
+# questions, or fewer than a quiz asks for, is topped up in the background.
+QUESTION_BANK = _bool("EDUMIND_QUESTION_BANK", True)
+QUESTION_BANK_DB = os.getenv("EDUMIND_QUESTION_BANK_DB", os.path.join("data", "question_bank.db"))
+QUESTION_BANK_SIZE = _int("EDUMIND_QUESTION_BANK_SIZE", 30)
+QUESTION_BANK_LOW_WATER = _int("EDUMIND_QUESTION_BANK_LOW_WATER", 10)
+
+# Topic segmentation: upper bound on clusters, and central chunks kept per topic as generation context
+MAX_TOPICS = _int("EDUMIND_MAX_TOPICS", 8)
+TOPIC_REPRESENTATIVES = _int("EDUMIND_TOPIC_REPRESENTATIVES", 6)
+TOPIC_CONTEXT_CHARS = _int("EDUMIND_TOPIC_CONTEXT_CHARS", 4000)
+
+# LLM response cache: in-process LRU size and TTL, optional SQLite file for a
+# persistent tier, and near-duplicate chat matching by query embedding
+LLM_CACHE_SIZE = _int("EDUMIND_LLM_CACHE_SIZE", 512)
+LLM_CACHE_TTL_SECONDS = _int("EDUMIND_LLM_CACHE_TTL_SECONDS", 24 * 3600)
+LLM_CACHE_DB = os.getenv("EDUMIND_LLM_CACHE_DB", "")
+LLM_SEMANTIC_CACHE = _bool("EDUMIND_LLM_SEMANTIC_CACHE", False)
+LLM_SEMANTIC_THRESHOLD = _float("EDUMIND_LLM_SEMANTIC_THRESHOLD", 0.92)
+
+# Quiz sessions: in-process LRU size and idle TTL, and an optional SQLite file
+# that keeps sessions (questions, answer keys and answers so far) across restarts
+SESSION_CACHE_SIZE = _int("EDUMIND_SESSION_CACHE_SIZE", 1024)
+SESSION_TTL_SECONDS = _int("EDUMIND_SESSION_TTL_SECONDS", 6 * 3600)
+SESSION_DB = os.getenv("EDUMIND_SESSION_DB", "")
+
+# Learner analytics: SQLite file of per-student topic mastery, the weight of the
+# newest answer in a topic's decayed accuracy, and the accuracy below which a
+# topic counts as weak (weak topics get a larger share of the next quiz)
+ANALYTICS_DB = os.getenv("EDUMIND_ANALYTICS_DB", os.path.join("data", "analytics.db"))
+ANALYTICS_DECAY = _float("EDUMIND_ANALYTICS_DECAY", 0.3)
+ANALYTICS_WEAK_THRESHOLD = _float("EDUMIND_ANALYTICS_WEAK_THRESHOLD", 0.7)
+
+# Gemini client: concurrent calls, per-attempt timeout, overall deadline across
+# retries, backoff bases for transient and rate-limit (429) errors, and the
+# delay after which a slow call is hedged with a duplicate (0 disables hedging)
+LLM_MAX_CONCURRENCY = _int("EDUMIND_LLM_MAX_CONCURRENCY", 8)
+LLM_TIMEOUT_SECONDS = _float("EDUMIND_LLM_TIMEOUT_SECONDS", 60.0)
+LLM_DEADLINE_SECONDS = _float("EDUMIND_LLM_DEADLINE_SECONDS", 120.0)
+LLM_MAX_RETRIES = _int("EDUMIND_LLM_MAX_RETRIES", 4)
+LLM_BACKOFF_BASE_SECONDS = _float("EDUMIND_LLM_BACKOFF_BASE_SECONDS", 0.5)
+LLM_RATE_LIMIT_BACKOFF_SECONDS = _float("EDUMIND_LLM_RATE_LIMIT_BACKOFF_SECONDS", 2.0)
+LLM_HEDGE_AFTER_SECONDS = _float("EDUMIND_LLM_HEDGE_AFTER_SECONDS", 0.0)
+
+# Metrics: latency histograms, error and in-flight counts for graph nodes, LLM,
+# vector store and tool calls, served at /metrics. With TRACING every API
+# request gets a trace ID (an incoming X-Trace-Id is always honoured) whose
+# spans are kept for the last TRACE_BUFFER_SIZE traces at /api/traces/{id}.
+METRICS = _bool("EDUMIND_METRICS", True)
+TRACING = _bool("EDUMIND_TRACING", False)
+TRACE_BUFFER_SIZE = _int("EDUMIND_TRACE_BUFFER_SIZE", 256)
+
+# Startup: build the embedding model and vector DB client (and run a dummy
+# encode) before serving, instead of inside the first user request
+WARMUP = _bool("EDUMIND_WARMUP", False)
+
+# Vector storage: "qdrant" (server from backend/config.py) or "local" (embedded,
+# memory-mapped per-document matrices under VECTOR_STORE_DIR). Local documents
+# with at least LOCAL_ANN_THRESHOLD chunks are searched through an IVF index.
+VECTOR_BACKEND = os.getenv("EDUMIND_VECTOR_BACKEND", "qdrant").lower()
+VECTOR_STORE_DIR = os.getenv("EDUMIND_VECTOR_STORE_DIR", os.path.join("data", "vectors"))
+LOCAL_VECTOR_DTYPE = os.getenv("EDUMIND_LOCAL_VECTOR_DTYPE", "float32")
+LOCAL_ANN_THRESHOLD = _int("EDUMIND_LOCAL_ANN_THRESHOLD", 20000)
@@ -1,4 +1,4 @@
-from typing import List, TypedDict, Optional
+from typing import Annotated, Dict, List, TypedDict, Optional
 
 class Question(TypedDict):
     id: int
@@ -10,19 +10,32 @@ class Question(TypedDict):
     type: str # 'MCQ' or 'Subjective'
     topic: str
 
+class ReplaceQuestions(list):
+    """Marker list: a node returning this replaces generated_questions instead of extending it"""
+
+def merge_questions(existing: List[Question], new: List[Question]) -> List[Question]:
+    """Reducer that lets parallel generator nodes contribute to the same question list"""
+    if isinstance(new, ReplaceQuestions):
+        return list(new)
+    return (existing or []) + (new or [])
+
 class TeacherState(TypedDict):
     pdf_path: str
+    doc_hash: str  # Content hash of the uploaded PDF
     extracted_text: str
     topics: List[str]
+    topic_contexts: Dict[str, List[str]]  # Topic name -> representative chunks, most central first
     mcq_count: int
     include_subjective: bool
-    generated_questions: List[Question]
+    generated_questions: Annotated[List[Question], merge_questions]
     worksheet_markdown: str
     answer_key_markdown: str
     pdf_path: str  # Path to generated PDF
 
 class StudentState(TypedDict):
+    student_id: str  # Browser-held learner ID; empty for anonymous quizzes
     pdf_path: str
+    doc_hash: str  # Content hash of the uploaded PDF
     extracted_text: str
     current_topic: str
     quiz_history: List[dict] # {question_id, user_answer, is_correct, time_taken}
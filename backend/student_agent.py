@@ -1,43 +1,65 @@
 from langgraph.graph import StateGraph, END
 from backend.state import StudentState, Question
-from backend.vector_store import search_documents, add_documents
-from backend.llm import generate_json, generate_text
-import pypdf
+from backend.vector_store import search_documents
+from backend.ingestion import registry
+from backend.topics import segment_topics
+from backend.gemini_client import LLMError
+from backend.llm import generate_json, generate_text, generate_text_async, stream_text
+from backend.metrics import traced
+from backend.concurrency import run_in_pool
+from backend.analytics import learner_analytics
+from backend.question_bank import question_bank
+from backend.settings import PLOT_FORMAT, QUESTION_BANK
 import random
+import os
+import re
+from typing import AsyncIterator, List, Optional, Tuple
 
-# Node: PDF Extraction & Embedding (Same as Teacher)
+# Node: PDF Extraction & Embedding (Same as Teacher, cached per document content)
+@traced("student_node")
 def extract_pdf_node(state: StudentState):
-    print(f"Extracting text for student from {state['pdf_path']}...")
-    text = ""
-    try:
-        reader = pypdf.PdfReader(state['pdf_path'])
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-    except Exception as e:
-        print(f"Error reading PDF: {e}")
-        text = "Error reading PDF content."
-
-    chunks = [chunk for chunk in text.split('\n\n') if len(chunk) > 50]
-    if chunks:
-        add_documents(chunks, {"source": state['pdf_path'], "pdf_path": state['pdf_path']})
-        
-    return {"extracted_text": text}
+    doc = registry.ingest(state['pdf_path'])
+    return {"extracted_text": doc["text"], "doc_hash": doc["doc_hash"]}
+
+def _quiz_queries(doc_hash: Optional[str]) -> List[str]:
+    """Retrieval queries for a quiz: the document's topic names, or a generic query"""
+    doc = registry.get(doc_hash) if doc_hash else None
+    if doc is None or not doc["chunks"]:
+        return ["main concepts and topics"]
+    return [topic["name"] for topic in segment_topics(doc["chunks"], doc["embeddings"])]
 
 # Node: Generate Quiz Questions
+@traced("student_node")
 def generate_quiz_questions_node(state: StudentState):
     print("Generating quiz questions...")
     
     num_questions = state.get('num_questions', 5)
     difficulty = state.get('difficulty', 'Medium')
     pdf_path = state.get('pdf_path', '')
+    doc_hash = state.get('doc_hash')
+    weak_areas = state.get('weak_areas') or []
     
-    # Search for documents from THIS specific PDF only
-    context_docs = search_documents("main concepts and topics", limit=5, pdf_path=pdf_path)
+    # Serve from the document's question bank when it holds enough questions
+    if QUESTION_BANK and doc_hash:
+        banked = question_bank.sample(doc_hash, num_questions, difficulty, focus_topics=weak_areas)
+        if banked:
+            print(f"Serving {len(banked)} questions from the question bank")
+            return {"generated_questions": banked, "current_question_index": 0}
+    
+    # Search for documents from THIS specific PDF only, once per topic so the quiz covers the document
+    results = [search_documents(query, limit=2, pdf_path=pdf_path, doc_hash=doc_hash) for query in _quiz_queries(doc_hash)]
+    context_docs = []
+    # Best hit of every topic first, so truncating the context drops depth rather than whole topics
+    for rank in range(2):
+        for docs in results:
+            if rank < len(docs) and docs[rank] not in context_docs:
+                context_docs.append(docs[rank])
     context_text = "\n".join([doc['text'] for doc in context_docs])
     
     if not context_text.strip():
         # Fallback if no context found
         context_text = "No specific context available. Please use general knowledge."
+    focus = f"\n    Give extra weight to topics this student finds difficult: {', '.join(weak_areas)}\n" if weak_areas else ""
     
     prompt = f"""
     Based on the following context from the uploaded document, generate {num_questions} multiple choice questions.
@@ -47,7 +69,7 @@ def generate_quiz_questions_node(state: StudentState):
     - Easy: Basic recall and understanding questions
     - Medium: Application and analysis questions  
     - Hard: Complex synthesis and evaluation questions
-    
+    {focus}
     Context from uploaded PDF:
     {context_text[:3000]}
     
@@ -70,6 +92,9 @@ def generate_quiz_questions_node(state: StudentState):
     """
     
     questions = generate_json(prompt)
+    if questions and isinstance(questions, list) and QUESTION_BANK and doc_hash:
+        # Questions generated live are banked for later quizzes too, under the difficulty asked for
+        question_bank.add(doc_hash, [dict(q, difficulty=difficulty) for q in questions if isinstance(q, dict)])
     if not questions or not isinstance(questions, list):
         # Fallback
         questions = [{
@@ -89,10 +114,18 @@ def generate_quiz_questions_node(state: StudentState):
         
     return {"generated_questions": questions, "current_question_index": 0}
 
-# Node: Analysis (After answer)
+# Node: Analysis (student's standing on this document, read from the mastery model)
+@traced("student_node")
 def analyze_performance_node(state: StudentState):
-    # Simple mock analysis for now
-    return {"weak_areas": ["Cell Organelles"], "learning_path": ["Review Chapter 3"]}
+    student_id = state.get('student_id')
+    if not student_id:
+        return {"weak_areas": [], "learning_path": []}
+    doc_hash = state.get('doc_hash')
+    weak = learner_analytics.weak_topics(student_id, doc_hash)
+    return {
+        "weak_areas": [row["topic"] for row in weak],
+        "learning_path": learner_analytics.learning_path(student_id, doc_hash)
+    }
 
 # Build Graph
 workflow = StateGraph(StudentState)
@@ -102,16 +135,23 @@ workflow.add_node("generate_quiz_questions", generate_quiz_questions_node)
 workflow.add_node("analyze_performance", analyze_performance_node)
 
 workflow.set_entry_point("extract_pdf")
-workflow.add_edge("extract_pdf", "generate_quiz_questions")
+# Weak topics from earlier quizzes steer which questions this quiz draws
+workflow.add_edge("extract_pdf", "analyze_performance")
+workflow.add_edge("analyze_performance", "generate_quiz_questions")
 workflow.add_edge("generate_quiz_questions", END) 
 
 student_graph = workflow.compile()
 
 # Separate Chat Function with Tool Support
-def chat_with_pdf(query: str, pdf_path: str):
-    """Enhanced chat with tool support for math, plots, tables, and diagrams"""
-    from backend.tools import math_solver, plot_generator, table_formatter, diagram_generator
-    
+def _with_page(doc: dict) -> str:
+    """Chunk text labelled with its page range when the payload has one"""
+    if not doc.get("page_start"):
+        return doc['text']
+    pages = doc["page_start"] if doc["page_start"] == doc.get("page_end") else f"{doc['page_start']}-{doc['page_end']}"
+    return f"[Page {pages}] {doc['text']}"
+
+def _build_chat_prompt(query: str, pdf_path: str) -> str:
+    """Retrieve context for the query and build the tutor prompt"""
     # Detect if query needs tools
     query_lower = query.lower()
     needs_math = any(word in query_lower for word in ['solve', 'equation', 'calculate', 'evaluate', 'math'])
@@ -120,8 +160,9 @@ def chat_with_pdf(query: str, pdf_path: str):
     needs_diagram = any(word in query_lower for word in ['flowchart', 'diagram', 'steps', 'process'])
     
     # RAG - Get context from specific PDF
-    docs = search_documents(query, limit=3, pdf_path=pdf_path)
-    context = "\n".join([d['text'] for d in docs])
+    doc_hash = registry.hash_for_path(pdf_path) if os.path.exists(pdf_path) else None
+    docs = search_documents(query, limit=3, pdf_path=pdf_path, doc_hash=doc_hash)
+    context = "\n\n".join(_with_page(d) for d in docs)
     
     # Build enhanced prompt
     tool_instructions = ""
@@ -132,7 +173,7 @@ def chat_with_pdf(query: str, pdf_path: str):
     if needs_diagram:
         tool_instructions += "\nIf a process needs to be shown, list steps clearly."
     
-    prompt = f"""
+    return f"""
     You are a helpful tutor. Answer the student's question based on the context provided.
     If the answer is not in the context, say so but try to help with general knowledge.
     {tool_instructions}
@@ -151,30 +192,66 @@ def chat_with_pdf(query: str, pdf_path: str):
     2. [Question 2]
     3. [Question 3]
     """
-    
-    response_text = generate_text(prompt)
-    
+
+def _solution_result(equation: str, result: dict) -> Optional[dict]:
+    if 'solutions' not in result:
+        return None
+    return {
+        "kind": "solution",
+        "input": equation,
+        "solutions": result['solutions'],
+        "markdown": f"\n\n**Solution:** {', '.join(result['solutions'])}"
+    }
+
+def _solve_tool(equation: str) -> Optional[dict]:
+    from backend.tools import math_solver
+    return _solution_result(equation, math_solver.solve_equation(equation))
+
+def _plot_tool(function: str) -> Optional[dict]:
+    from backend.tools import plot_generator
+    result = plot_generator.create_function_plot(function, fmt=PLOT_FORMAT)
+    if 'image_base64' not in result:
+        return None
+    return {
+        "kind": "plot",
+        "input": function,
+        "image_base64": result['image_base64'],
+        "mime_type": result['mime_type'],
+        "markdown": "\n\n**Graph:** [Plot generated - see visualization]"
+    }
+
+def _line_tool_results(line: str) -> List[dict]:
+    """Tool results for one completed response line containing EQUATION: or PLOT:"""
+    results = []
+    equation = re.search(r'EQUATION:\s*([^\n]+)', line)
+    if equation:
+        results.append(_solve_tool(equation.group(1).strip()))
+    function = re.search(r'PLOT:\s*([^\n]+)', line)
+    if function:
+        results.append(_plot_tool(function.group(1).strip()))
+    return [result for result in results if result]
+
+def _apply_tools(response_text: str) -> str:
+    """Run EQUATION:/PLOT: lines through the tools and append their results"""
     # Post-process to add tool outputs
     tool_outputs = []
     
-    # Check for equations to solve
+    # Check for equations to solve; all of them run in parallel under one deadline
     if "EQUATION:" in response_text:
-        import re
-        equations = re.findall(r'EQUATION:\s*([^\n]+)', response_text)
-        for eq in equations:
-            result = math_solver.solve_equation(eq.strip())
-            if 'solutions' in result:
-                tool_outputs.append(f"\n\n**Solution:** {', '.join(result['solutions'])}")
+        from backend.tools import math_solver
+        equations = [eq.strip() for eq in re.findall(r'EQUATION:\s*([^\n]+)', response_text)]
+        for eq, solved in zip(equations, math_solver.solve_equations(equations)):
+            result = _solution_result(eq, solved)
+            if result:
+                tool_outputs.append(result['markdown'])
     
     # Check for functions to plot
     if "PLOT:" in response_text:
-        import re
         functions = re.findall(r'PLOT:\s*([^\n]+)', response_text)
         for func in functions:
-            result = plot_generator.create_function_plot(func.strip())
-            if 'image_base64' in result:
-                tool_outputs.append(f"\n\n**Graph:** [Plot generated - see visualization]")
-                # In a real implementation, you'd return the image data
+            result = _plot_tool(func.strip())
+            if result:
+                tool_outputs.append(result['markdown'])
     
     # Combine response with tool outputs
     final_response = response_text
@@ -182,3 +259,57 @@ def chat_with_pdf(query: str, pdf_path: str):
         final_response += "\n\n---\n**Tool Results:**" + "".join(tool_outputs)
     
     return final_response
+
+def chat_with_pdf(query: str, pdf_path: str):
+    """Enhanced chat with tool support for math, plots, tables, and diagrams"""
+    prompt = _build_chat_prompt(query, pdf_path)
+    response_text = generate_text(prompt, semantic_query=query, semantic_scope=pdf_path)
+    return _apply_tools(response_text)
+
+async def achat_with_pdf(query: str, pdf_path: str):
+    """chat_with_pdf for async handlers: blocking stages run on the graph pool, Gemini is awaited"""
+    prompt = await run_in_pool(_build_chat_prompt, query, pdf_path)
+    response_text = await generate_text_async(prompt, semantic_query=query, semantic_scope=pdf_path)
+    return await run_in_pool(_apply_tools, response_text)
+
+async def astream_chat_with_pdf(query: str, pdf_path: str) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Streaming chat: yields ("token", {"text"}) as Gemini produces output,
+    ("tool", {...}) as soon as an EQUATION:/PLOT: line is complete, and a
+    final ("done", ...) whose "response" includes the tool results and
+    whose "answer" is the model text alone. If the stream breaks after text
+    was sent, an ("error", {"message", "answer"}) replaces "done".
+    """
+    prompt = await run_in_pool(_build_chat_prompt, query, pdf_path)
+    
+    response_text = ""
+    pending_line = ""
+    tool_outputs = []
+    
+    async def tool_events(line: str):
+        if "EQUATION:" in line or "PLOT:" in line:
+            for result in await run_in_pool(_line_tool_results, line):
+                tool_outputs.append(result['markdown'])
+                yield ("tool", result)
+    
+    try:
+        async for text in stream_text(prompt, semantic_query=query, semantic_scope=pdf_path):
+            response_text += text
+            yield ("token", {"text": text})
+            
+            pending_line += text
+            *complete_lines, pending_line = pending_line.split("\n")
+            for line in complete_lines:
+                async for event in tool_events(line):
+                    yield event
+    except LLMError as e:
+        yield ("error", {"message": f"The answer was interrupted: {e}", "answer": response_text})
+        return
+    
+    async for event in tool_events(pending_line):
+        yield event
+    
+    final_response = response_text
+    if tool_outputs:
+        final_response += "\n\n---\n**Tool Results:**" + "".join(tool_outputs)
+    yield ("done", {"response": final_response, "answer": response_text})
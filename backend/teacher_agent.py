@@ -1,44 +1,71 @@
 from langgraph.graph import StateGraph, END
-from backend.state import TeacherState, Question
-from backend.vector_store import add_documents
+from backend.state import TeacherState, Question, ReplaceQuestions
+from backend.ingestion import registry
 from backend.llm import generate_json
-import pypdf
+from backend.metrics import traced
+from backend.settings import GENERATION_WORKERS, MCQ_BATCH_SIZE, TOPIC_CONTEXT_CHARS
+from backend.topics import segment_topics
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from typing import List, Tuple
 
-# Node: PDF Extraction & Embedding
+# Node: PDF Extraction & Embedding (cached per document content)
+@traced("teacher_node")
 def extract_pdf_node(state: TeacherState):
-    print(f"Extracting text from {state['pdf_path']}...")
-    text = ""
-    try:
-        reader = pypdf.PdfReader(state['pdf_path'])
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-    except Exception as e:
-        print(f"Error reading PDF: {e}")
-        text = "Error reading PDF content."
+    doc = registry.ingest(state['pdf_path'])
+    return {"extracted_text": doc["text"], "doc_hash": doc["doc_hash"]}
 
-    # Chunk and Store in Qdrant
-    # Simple chunking by paragraphs or fixed size
-    chunks = [chunk for chunk in text.split('\n\n') if len(chunk) > 50]
-    if chunks:
-        add_documents(chunks, {"source": state['pdf_path']})
+# Node: Topic Segmentation (clusters the chunk embeddings computed at ingestion)
+@traced("teacher_node")
+def segment_topics_node(state: TeacherState):
+    doc = registry.get(state.get('doc_hash', ''))
+    topics = segment_topics(doc["chunks"], doc["embeddings"]) if doc else []
+    if not topics:
+        return {"topics": ["General Content"], "topic_contexts": {}}
     
-    return {"extracted_text": text}
+    print(f"Segmented {len(doc['chunks'])} chunks into {len(topics)} topics")
+    return {
+        "topics": [topic["name"] for topic in topics],
+        "topic_contexts": {topic["name"]: topic["representatives"] for topic in topics}
+    }
 
-# Node: Topic Segmentation (Simplified to just pass through for now, or use LLM)
-def segment_topics_node(state: TeacherState):
-    # For now, we'll just use the whole text or rely on the LLM to pick topics
-    return {"topics": ["General Content"]} 
+def _mcq_batches(topics: List[str], mcq_count: int) -> List[Tuple[str, int, int]]:
+    """Split the MCQ count across topics into (topic, count, part) batches of at most MCQ_BATCH_SIZE"""
+    topics = topics or ["General Content"]
+    batches = []
+    for t, topic in enumerate(topics):
+        topic_count = mcq_count // len(topics) + (1 if t < mcq_count % len(topics) else 0)
+        part = 0
+        while topic_count > 0:
+            count = min(topic_count, MCQ_BATCH_SIZE)
+            batches.append((topic, count, part))
+            topic_count -= count
+            part += 1
+    return batches
 
-# Node: MCQ Generator
-def generate_mcq_node(state: TeacherState):
-    print(f"Generating {state['mcq_count']} MCQs...")
-    
+def _context_window(text: str, part: int, parts: int, size: int = 5000) -> str:
+    """The part-th of `parts` evenly spaced windows over the text, so sub-batches see different pages"""
+    if parts <= 1 or len(text) <= size:
+        return text[:size]
+    start = (len(text) - size) * part // (parts - 1)
+    return text[start:start + size]
+
+def _topic_context(state: TeacherState, topic: str, part: int, parts: int) -> str:
+    """Compact context for one generation batch: its topic's central chunks, split across sub-batches"""
+    representatives = (state.get('topic_contexts') or {}).get(topic)
+    if not representatives:
+        return _context_window(state['extracted_text'], part, parts)
+    selected = representatives[part::parts] or representatives
+    return "\n\n".join(selected)[:TOPIC_CONTEXT_CHARS]
+
+def _generate_mcq_batch(state: TeacherState, topic: str, count: int, part: int, parts: int) -> List[Question]:
+    focus = "" if topic == "General Content" else f"\n    Focus on the topic: {topic}\n"
     prompt = f"""
-    Based on the following text, generate {state['mcq_count']} multiple choice questions.
+    Based on the following text, generate {count} multiple choice questions.
     The difficulty level should be mixed (Easy, Medium, Hard).
-    
-    Text Content (truncated):
-    {state['extracted_text'][:5000]}
+    {focus}
+    Text Content:
+    {_topic_context(state, topic, part, parts)}
     
     Output format (JSON list of objects):
     [
@@ -56,25 +83,51 @@ def generate_mcq_node(state: TeacherState):
     """
     
     response = generate_json(prompt)
-    questions = response if isinstance(response, list) else []
+    return response if isinstance(response, list) else []
+
+# Node: MCQ Generator (independent per-topic sub-batches run concurrently)
+@traced("teacher_node")
+def generate_mcq_node(state: TeacherState):
+    print(f"Generating {state['mcq_count']} MCQs...")
+    
+    batches = _mcq_batches(state.get('topics'), state['mcq_count'])
+    parts_per_topic = {}
+    for topic, _, _ in batches:
+        parts_per_topic[topic] = parts_per_topic.get(topic, 0) + 1
+    
+    if not batches:
+        return {"generated_questions": []}
+    if len(batches) == 1:
+        topic, count, part = batches[0]
+        return {"generated_questions": _generate_mcq_batch(state, topic, count, part, 1)}
+    
+    with ThreadPoolExecutor(max_workers=min(len(batches), GENERATION_WORKERS)) as pool:
+        # Each batch runs in a copy of this context so its LLM spans join the request's trace
+        futures = [
+            pool.submit(contextvars.copy_context().run, _generate_mcq_batch,
+                        state, topic, count, part, parts_per_topic[topic])
+            for topic, count, part in batches
+        ]
+        questions = [q for future in futures for q in future.result()]
     
-    # Assign IDs if missing
-    for i, q in enumerate(questions):
-        q['id'] = i + 1
-        
     return {"generated_questions": questions}
 
-# Node: Subjective Generator
+# Node: Subjective Generator (runs in parallel with generate_mcq)
+@traced("teacher_node")
 def generate_subjective_node(state: TeacherState):
     if not state.get('include_subjective', False):
         return {}
     
     print("Generating subjective questions...")
+    # The most central chunk of every topic, so questions span the whole document
+    topic_contexts = state.get('topic_contexts') or {}
+    context = "\n\n".join(reps[0] for reps in topic_contexts.values() if reps) or state['extracted_text']
+    
     prompt = f"""
     Based on the following text, generate 3 subjective questions (Short Answer, Long Answer).
     
     Text Content (truncated):
-    {state['extracted_text'][:5000]}
+    {context[:5000]}
     
     Output format (JSON list of objects):
     [
@@ -94,14 +147,19 @@ def generate_subjective_node(state: TeacherState):
     response = generate_json(prompt)
     new_qs = response if isinstance(response, list) else []
     
-    # Adjust IDs
-    start_id = len(state['generated_questions']) + 1
-    for i, q in enumerate(new_qs):
-        q['id'] = start_id + i
-        
-    return {"generated_questions": state['generated_questions'] + new_qs}
+    return {"generated_questions": new_qs}
+
+# Node: Number Questions (after both generators have merged their results)
+@traced("teacher_node")
+def number_questions_node(state: TeacherState):
+    # MCQs first, then subjective, regardless of which branch finished first
+    questions = sorted(state['generated_questions'], key=lambda q: q.get('type') == 'Subjective')
+    for i, q in enumerate(questions):
+        q['id'] = i + 1
+    return {"generated_questions": ReplaceQuestions(questions)}
 
 # Node: Export Worksheet
+@traced("teacher_node")
 def export_worksheet_node(state: TeacherState):
     print("Formatting worksheet...")
     from backend.tools import pdf_exporter
@@ -142,13 +200,16 @@ workflow.add_node("extract_pdf", extract_pdf_node)
 workflow.add_node("segment_topics", segment_topics_node)
 workflow.add_node("generate_mcq", generate_mcq_node)
 workflow.add_node("generate_subjective", generate_subjective_node)
+workflow.add_node("number_questions", number_questions_node)
 workflow.add_node("export_worksheet", export_worksheet_node)
 
 workflow.set_entry_point("extract_pdf")
 workflow.add_edge("extract_pdf", "segment_topics")
+# Fan out: both generators run in the same superstep, then join before numbering
 workflow.add_edge("segment_topics", "generate_mcq")
-workflow.add_edge("generate_mcq", "generate_subjective")
-workflow.add_edge("generate_subjective", "export_worksheet")
+workflow.add_edge("segment_topics", "generate_subjective")
+workflow.add_edge(["generate_mcq", "generate_subjective"], "number_questions")
+workflow.add_edge("number_questions", "export_worksheet")
 workflow.add_edge("export_worksheet", END)
 
 teacher_graph = workflow.compile()
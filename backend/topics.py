@@ -0,0 +1,101 @@
+"""
+Topic segmentation by clustering chunk embeddings.
+Chunks already embedded at ingestion are grouped with a vectorized spherical
+k-means; each topic keeps the chunks closest to its centroid as compact
+context for question generation.
+"""
+
+import math
+from typing import List, Tuple, TypedDict
+
+import numpy as np
+
+from backend.settings import MAX_TOPICS, TOPIC_REPRESENTATIVES
+
+
+class Topic(TypedDict):
+    name: str
+    chunk_indices: List[int]
+    representatives: List[str]  # Most central chunks first
+
+
+def _normalize(X: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.maximum(norms, 1e-12)
+
+
+def kmeans(X: np.ndarray, k: int, iterations: int = 25, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means with k-means++ seeding on row-normalized X.
+    Returns (labels, centroids).
+    """
+    rng = np.random.default_rng(seed)
+    n = X.shape[0]
+
+    # k-means++ seeding on cosine distance
+    centroids = [X[rng.integers(n)]]
+    closest = 1.0 - X @ centroids[0]
+    for _ in range(1, k):
+        weights = np.clip(closest, 0, None) ** 2
+        total = weights.sum()
+        index = rng.choice(n, p=weights / total) if total > 0 else rng.integers(n)
+        centroids.append(X[index])
+        closest = np.minimum(closest, 1.0 - X @ X[index])
+    centroids = np.stack(centroids)
+
+    labels = np.full(n, -1)
+    for _ in range(iterations):
+        new_labels = np.argmax(X @ centroids.T, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, X)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]
+        centroids = _normalize(sums)
+    return labels, centroids
+
+
+def _topic_name(chunk: str, max_words: int = 8) -> str:
+    first_line = next((line.strip() for line in chunk.splitlines() if line.strip()), "")
+    words = first_line.split()
+    name = " ".join(words[:max_words])
+    return name + ("..." if len(words) > max_words else "")
+
+
+def segment_topics(chunks: List[str], embeddings: np.ndarray,
+                   max_topics: int = MAX_TOPICS, representatives: int = TOPIC_REPRESENTATIVES) -> List[Topic]:
+    """Cluster chunks into topics ordered by where they first appear in the document"""
+    if not chunks:
+        return []
+    X = _normalize(np.asarray(embeddings, dtype=np.float32))
+    k = max(1, min(max_topics, round(math.sqrt(len(chunks) / 2))))
+    if k == 1:
+        return [{
+            "name": "General Content",
+            "chunk_indices": list(range(len(chunks))),
+            "representatives": chunks[:representatives],
+        }]
+
+    labels, centroids = kmeans(X, k)
+    similarity = np.einsum("ij,ij->i", X, centroids[labels])
+
+    topics: List[Topic] = []
+    seen_names = set()
+    for cluster in range(k):
+        members = np.flatnonzero(labels == cluster)
+        if members.size == 0:
+            continue
+        central = members[np.argsort(-similarity[members])][:representatives]
+        name = _topic_name(chunks[central[0]]) or f"Topic {len(topics) + 1}"
+        if name in seen_names:
+            name = f"{name} ({len(topics) + 1})"
+        seen_names.add(name)
+        topics.append({
+            "name": name,
+            "chunk_indices": members.tolist(),
+            "representatives": [chunks[i] for i in central],
+        })
+    topics.sort(key=lambda topic: topic["chunk_indices"][0])
+    return topics
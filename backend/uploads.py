@@ -0,0 +1,192 @@
+"""
+Streaming PDF uploads.
+The multipart body is parsed as it arrives: the file's bytes are hashed and
+written to a part file in UPLOAD_CHUNK_BYTES blocks, so nothing is spooled and
+copied again, and an oversized upload is cut off as soon as it crosses the
+limit. The finished file is stored as {sha256}.pdf, so identical uploads share
+one file and one ingestion, and ingestion can start before anyone asks for it.
+"""
+
+import hashlib
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from backend.concurrency import run_in_pool
+from backend.metrics import traced
+from backend.settings import UPLOAD_CHUNK_BYTES, UPLOAD_INGEST_WORKERS, UPLOAD_MAX_BYTES
+
+# Headers and boundaries around the file part; a body this far past the limit is rejected unread
+_MULTIPART_OVERHEAD = 64 * 1024
+
+# Pre-ingestion gets its own threads, so a burst of large uploads queues here
+# instead of occupying the graph pool that request handlers run on
+_ingest_pool = ThreadPoolExecutor(max_workers=UPLOAD_INGEST_WORKERS, thread_name_prefix="edumind-ingest")
+
+
+class UploadError(ValueError):
+    """The request is not a PDF upload"""
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class _PartFile:
+    """Blocking side of an upload: hashes and writes blocks, then moves the file to its content address"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, f".{uuid.uuid4().hex}.part")
+        self.digest = hashlib.sha256()
+        self._file = open(self.path, "wb")
+
+    def write(self, data: bytes):
+        self.digest.update(data)
+        self._file.write(data)
+
+    def finish(self) -> tuple:
+        """(path, doc_hash, duplicate); an identical file already stored is kept and this copy dropped"""
+        self._file.close()
+        doc_hash = self.digest.hexdigest()
+        path = os.path.join(self.directory, f"{doc_hash}.pdf")
+        if os.path.exists(path):
+            os.remove(self.path)
+            return path, doc_hash, True
+        os.replace(self.path, path)
+        return path, doc_hash, False
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _FilePart:
+    """Multipart callbacks that keep the bytes of the `file` field and drop every other part"""
+
+    def __init__(self, field: bytes):
+        self.field = field
+        self.filename = None
+        self.buffer = bytearray()
+        self.size = 0
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file = False
+        self._seen = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._field_data,
+            "on_header_value": self._value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _part_begin(self):
+        self._headers = {}
+
+    def _field_data(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _value_data(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        # Only the first file part counts; a repeated field is ignored
+        self._in_file = not self._seen and options.get(b"name") == self.field and b"filename" in options
+        if self._in_file:
+            self._seen = True
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+
+    def _part_data(self, data, start, end):
+        if self._in_file:
+            self.buffer += data[start:end]
+            self.size += end - start
+
+    def _part_end(self):
+        self._in_file = False
+
+
+@traced("upload", "receive")
+async def receive_pdf(request, directory: str, field: str = "file",
+                      max_bytes: int = UPLOAD_MAX_BYTES, chunk_bytes: int = UPLOAD_CHUNK_BYTES) -> dict:
+    """
+    Stream the `field` file of a multipart request into directory/{sha256}.pdf.
+    Raises UploadTooLarge past max_bytes and UploadError for anything that is not a PDF upload.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadError("Expected a multipart/form-data upload")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes + _MULTIPART_OVERHEAD:
+        raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+
+    part = _FilePart(field.encode("utf-8"))
+    parser = MultipartParser(options[b"boundary"], part.callbacks())
+    target = await run_in_pool(_PartFile, directory)
+    checked = False
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if part.size > max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+            if not checked and len(part.buffer) >= 5:
+                if not part.buffer.startswith(b"%PDF-"):
+                    raise UploadError("Only PDF files can be uploaded")
+                checked = True
+            if len(part.buffer) >= chunk_bytes:
+                block = bytes(part.buffer)
+                part.buffer.clear()
+                await run_in_pool(target.write, block)
+        parser.finalize()
+        if part.filename is None:
+            raise UploadError(f"No '{field}' file in the upload")
+        if not checked and not part.buffer.startswith(b"%PDF-"):
+            raise UploadError("Only PDF files can be uploaded")
+        if part.buffer:
+            await run_in_pool(target.write, bytes(part.buffer))
+        path, doc_hash, duplicate = await run_in_pool(target.finish)
+    except BaseException:
+        target.abort()
+        raise
+
+    return {
+        "filename": os.path.basename(path),
+        "path": path,
+        "doc_hash": doc_hash,
+        "original_filename": part.filename,
+        "size": part.size,
+        "duplicate": duplicate,
+    }
+
+
+def ingest_in_background(path: str, doc_hash: str):
+    """Queue extraction and embedding of an uploaded file so a later generate or start finds it ready"""
+    _ingest_pool.submit(_ingest_upload, path, doc_hash)
+
+
+def _ingest_upload(path: str, doc_hash: str):
+    # Lazy import: ingestion pulls in the vector store and encoder
+    from backend.ingestion import registry
+    try:
+        registry.remember_hash(path, doc_hash)
+        registry.ingest(path)
+    except Exception as e:
+        print(f"Background ingestion of {path} failed: {e}")
+
+
+def shutdown():
+    _ingest_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,433 @@
+"""
+Storage backends behind vector_store.add_documents / search_documents.
+QdrantBackend talks to a Qdrant server; LocalBackend keeps memory-mapped
+per-document matrices on disk and searches them in-process, with brute-force
+top-k for small documents and an IVF index for large ones.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import shutil
+from typing import Dict, Iterable, List, Optional, TypedDict
+
+import numpy as np
+
+
+class Hit(TypedDict):
+    id: str
+    score: float
+    payload: dict
+
+
+class VectorBackend:
+    """Interface every vector storage backend implements"""
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[dict]):
+        raise NotImplementedError
+
+    def search(self, vector: np.ndarray, limit: int, pdf_path: str = None, doc_hash: str = None) -> List[Hit]:
+        raise NotImplementedError
+
+    def delete_points(self, doc_hash: str, ids: List[str]):
+        raise NotImplementedError
+
+    def document_points(self, doc_hash: str) -> List[tuple]:
+        """(id, payload) of every stored point of a document, in no particular order"""
+        raise NotImplementedError
+
+    def delete_document(self, doc_hash: str):
+        raise NotImplementedError
+
+    def compact(self, keep: Iterable[str]) -> int:
+        """
+        Drop the points of every document whose hash is not in keep and tidy
+        storage; returns points dropped. An empty keep raises ValueError.
+        """
+        raise NotImplementedError
+
+    def warm(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class QdrantBackend(VectorBackend):
+    def __init__(self, client_factory, collection_name: str, dimension: int):
+        self._client_factory = client_factory
+        self.collection_name = collection_name
+        self.dimension = dimension
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    @property
+    def client(self):
+        return self._client_factory()
+
+    def ensure_collection(self):
+        """Create the collection and payload indexes if needed; checked once per process"""
+        if self._ready:
+            return
+        with self._ready_lock:
+            if not self._ready:
+                self._ensure_collection()
+                self._ready = True
+
+    def _ensure_collection(self):
+        client = self.client
+        try:
+            client.get_collection(self.collection_name)
+            # Try to create the indexes if they don't exist
+            for field_name in ("pdf_path", "doc_hash"):
+                try:
+                    client.create_payload_index(
+                        collection_name=self.collection_name,
+                        field_name=field_name,
+                        field_schema=self._models.PayloadSchemaType.KEYWORD
+                    )
+                except Exception:
+                    # Index might already exist
+                    pass
+        except Exception:
+            # Create collection
+            client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=self._models.VectorParams(size=self.dimension, distance=self._models.Distance.COSINE),
+            )
+            # Create indexes for pdf_path and doc_hash; doc_hash marks the tenant, so
+            # Qdrant co-locates each document's points and filtered search stays fast
+            client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name="pdf_path",
+                field_schema=self._models.PayloadSchemaType.KEYWORD
+            )
+            client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name="doc_hash",
+                field_schema=self._models.KeywordIndexParams(type=self._models.KeywordIndexType.KEYWORD, is_tenant=True)
+            )
+            print("Created collection with pdf_path and doc_hash indexes")
+
+    @property
+    def _models(self):
+        from qdrant_client.http import models
+        return models
+
+    def upsert(self, ids, vectors, payloads):
+        self.ensure_collection()
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=self._models.Batch(ids=ids, vectors=vectors.tolist(), payloads=payloads)
+        )
+
+    def search(self, vector, limit, pdf_path=None, doc_hash=None):
+        self.ensure_collection()
+        models = self._models
+
+        # Build filter if a document is given; doc_hash matches the same content under any filename
+        query_filter = None
+        if doc_hash:
+            query_filter = models.Filter(
+                must=[models.FieldCondition(key="doc_hash", match=models.MatchValue(value=doc_hash))]
+            )
+        elif pdf_path:
+            query_filter = models.Filter(
+                must=[models.FieldCondition(key="pdf_path", match=models.MatchValue(value=pdf_path))]
+            )
+
+        # query_points replaces search(), which newer qdrant-client releases no longer provide
+        hits = self.client.query_points(
+            collection_name=self.collection_name,
+            query=vector.tolist(),
+            query_filter=query_filter,
+            limit=limit
+        ).points
+        return [{"id": str(hit.id), "score": hit.score, "payload": hit.payload} for hit in hits]
+
+    def delete_document(self, doc_hash):
+        self.ensure_collection()
+        models = self._models
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(filter=models.Filter(
+                must=[models.FieldCondition(key="doc_hash", match=models.MatchValue(value=doc_hash))]
+            )),
+        )
+
+    def delete_points(self, doc_hash, ids):
+        self.ensure_collection()
+        self.client.delete(collection_name=self.collection_name,
+                           points_selector=self._models.PointIdsList(points=list(ids)))
+
+    def document_points(self, doc_hash):
+        self.ensure_collection()
+        models = self._models
+        doc_filter = models.Filter(must=[models.FieldCondition(key="doc_hash", match=models.MatchValue(value=doc_hash))])
+        points, offset = [], None
+        while True:
+            batch, offset = self.client.scroll(collection_name=self.collection_name, scroll_filter=doc_filter,
+                                               limit=256, offset=offset, with_payload=True, with_vectors=False)
+            points.extend((str(point.id), point.payload) for point in batch)
+            if offset is None:
+                return points
+
+    def compact(self, keep):
+        self.ensure_collection()
+        models = self._models
+        keep = list(keep)
+        if not keep:
+            # Filter() would select the whole collection
+            raise ValueError("Refusing to compact with an empty keep list")
+        # Points of uncatalogued documents, including legacy points without a doc_hash
+        stale = models.Filter(must_not=[models.FieldCondition(key="doc_hash", match=models.MatchAny(any=keep))])
+        dropped = self.client.count(collection_name=self.collection_name, count_filter=stale, exact=True).count
+        if dropped:
+            self.client.delete(collection_name=self.collection_name,
+                               points_selector=models.FilterSelector(filter=stale))
+        return dropped
+
+    def warm(self):
+        self.ensure_collection()
+
+    def close(self):
+        self._ready = False
+
+
+class _Shard:
+    def __init__(self, vectors: np.ndarray, payloads: List[dict], ids: List[str]):
+        self.vectors = vectors
+        self.payloads = payloads
+        self.ids = ids
+
+
+class _LocalDocument:
+    """
+    One document's vectors, stored as append-only shards of (vectors.npy, payloads.jsonl).
+    A rewrite adds a merged shard that supersedes every lower-numbered one, so
+    the old shards stay loadable until the merged one is in place.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.shards: List[_Shard] = []
+        self.ids = set()
+        self.pdf_paths = set()
+        self.ivf = None
+        self._next = 0
+        for name in sorted(os.listdir(directory)):
+            # Only numbered shards count; anything else is a merge interrupted part-way
+            if name.endswith(".npy") and name[:-4].isdigit():
+                self._load_shard(os.path.join(directory, name[:-4]))
+                self._next = int(name[:-4]) + 1
+
+    def _load_shard(self, stem: str):
+        vectors = np.load(stem + ".npy", mmap_mode="r")
+        with open(stem + ".jsonl", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        if records and records[0].get("supersedes"):
+            # A merged shard: the shards before it were left behind by a rewrite interrupted part-way
+            self.shards, self.ids, self.pdf_paths = [], set(), set()
+            records = records[1:]
+        ids = [record["id"] for record in records]
+        payloads = [record["payload"] for record in records]
+        self.shards.append(_Shard(vectors, payloads, ids))
+        self.ids.update(ids)
+        self.pdf_paths.update(p["pdf_path"] for p in payloads if p.get("pdf_path"))
+
+    def append(self, ids: List[str], vectors: np.ndarray, payloads: List[dict]):
+        stem = os.path.join(self.directory, f"{self._next:06d}")
+        self._next += 1
+        # Write payloads first: a shard only counts once its .npy exists
+        with open(stem + ".jsonl", "w", encoding="utf-8") as f:
+            for point_id, payload in zip(ids, payloads):
+                f.write(json.dumps({"id": point_id, "payload": payload}) + "\n")
+        np.save(stem + ".npy", vectors)
+        self._load_shard(stem)
+        self.ivf = None
+
+    @property
+    def size(self) -> int:
+        return sum(len(shard.ids) for shard in self.shards)
+
+    def matrix(self) -> np.ndarray:
+        return np.concatenate([np.asarray(shard.vectors, dtype=np.float32) for shard in self.shards])
+
+    def rewrite(self, exclude=frozenset()):
+        """Rewrite all shards as one, without the points in exclude"""
+        rows = list(self.rows())
+        keep = [i for i, (point_id, _) in enumerate(rows) if point_id not in exclude]
+        vectors = np.concatenate([np.asarray(shard.vectors) for shard in self.shards])[keep] \
+            if self.shards else np.empty((0, 0), dtype=np.float32)
+        name = f"{self._next:06d}"
+        stem = os.path.join(self.directory, name)
+        self._next += 1
+        with open(stem + ".jsonl", "w", encoding="utf-8") as f:
+            f.write(json.dumps({"supersedes": True}) + "\n")
+            for i in keep:
+                f.write(json.dumps({"id": rows[i][0], "payload": rows[i][1]}) + "\n")
+        # The rename of the .npy commits the merge; until then the old shards are what loads
+        np.save(os.path.join(self.directory, "merging.npy"), vectors)
+        os.replace(os.path.join(self.directory, "merging.npy"), stem + ".npy")
+        self._load_shard(stem)
+        self.ivf = None
+        for old in os.listdir(self.directory):
+            if not old.startswith(name + "."):
+                os.remove(os.path.join(self.directory, old))
+
+    def rows(self):
+        for shard in self.shards:
+            for point_id, payload in zip(shard.ids, shard.payloads):
+                yield point_id, payload
+
+
+class _IVFIndex:
+    """Inverted-file index: vectors bucketed by nearest k-means centroid, probing the closest buckets"""
+
+    def __init__(self, matrix: np.ndarray, rows: list, nprobe: int):
+        from backend.topics import kmeans
+        self.matrix = matrix
+        self.rows = rows
+        nlist = max(2, int(np.sqrt(len(matrix))))
+        # Train on a sample; assignment below covers every row
+        rng = np.random.default_rng(0)
+        sample = matrix[rng.choice(len(matrix), size=min(len(matrix), nlist * 64), replace=False)]
+        _, self.centroids = kmeans(sample, nlist, iterations=10)
+        assignments = np.argmax(matrix @ self.centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assignments == c) for c in range(nlist)]
+        self.nprobe = min(nprobe, nlist)
+
+    def search(self, vector: np.ndarray, limit: int):
+        probes = np.argsort(-(self.centroids @ vector))[:self.nprobe]
+        candidates = np.concatenate([self.lists[c] for c in probes])
+        scores = self.matrix[candidates] @ vector
+        top = np.argsort(-scores)[:limit]
+        return candidates[top], scores[top]
+
+
+class LocalBackend(VectorBackend):
+    """
+    Embedded vector index: one directory per document under `directory`,
+    vectors normalized and stored as float32 or float16 .npy shards that are
+    memory-mapped for search.
+    """
+
+    def __init__(self, directory: str, dtype: str = "float32", ann_threshold: int = 20000, nprobe: int = 8):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self._documents: Dict[str, _LocalDocument] = {}
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                self._documents[name] = _LocalDocument(path)
+
+    @staticmethod
+    def _document_key(payload: dict) -> str:
+        if payload.get("doc_hash"):
+            return payload["doc_hash"]
+        return "path-" + hashlib.sha256(payload.get("pdf_path", payload.get("source", "")).encode()).hexdigest()
+
+    def upsert(self, ids, vectors, payloads):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        groups: Dict[str, List[int]] = {}
+        for row, payload in enumerate(payloads):
+            groups.setdefault(self._document_key(payload), []).append(row)
+
+        with self._lock:
+            for key, rows in groups.items():
+                document = self._documents.get(key)
+                if document is None:
+                    path = os.path.join(self.directory, key)
+                    os.makedirs(path, exist_ok=True)
+                    document = self._documents[key] = _LocalDocument(path)
+                existing = {ids[row] for row in rows} & document.ids
+                if existing:
+                    # Re-ingesting unchanged content is a no-op; shards are append-only,
+                    # so points whose content changed are dropped before appending
+                    stored = {point_id: payload for point_id, payload in document.rows() if point_id in existing}
+                    rows = [row for row in rows if stored.get(ids[row]) != payloads[row]]
+                    replaced = {ids[row] for row in rows} & existing
+                    if replaced:
+                        document.rewrite(replaced)
+                if rows:
+                    document.append(
+                        [ids[row] for row in rows],
+                        vectors[rows].astype(self.dtype),
+                        [payloads[row] for row in rows],
+                    )
+
+    def delete_points(self, doc_hash, ids):
+        with self._lock:
+            document = self._documents.get(doc_hash)
+            if document is not None and document.ids & set(ids):
+                document.rewrite(set(ids))
+
+    def document_points(self, doc_hash):
+        with self._lock:
+            document = self._documents.get(doc_hash)
+            return list(document.rows()) if document is not None else []
+
+    def delete_document(self, doc_hash):
+        with self._lock:
+            document = self._documents.pop(doc_hash, None)
+        if document is not None:
+            shutil.rmtree(document.directory, ignore_errors=True)
+
+    def compact(self, keep):
+        keep = set(keep)
+        if not keep:
+            raise ValueError("Refusing to compact with an empty keep list")
+        dropped = 0
+        with self._lock:
+            for key in [key for key in self._documents if key not in keep]:
+                dropped += self._documents[key].size
+                self.delete_document(key)
+            for document in self._documents.values():
+                if len(document.shards) > 1:
+                    document.rewrite()
+        return dropped
+
+    def _candidates(self, pdf_path: Optional[str], doc_hash: Optional[str]) -> List[_LocalDocument]:
+        with self._lock:
+            if doc_hash:
+                document = self._documents.get(doc_hash)
+                return [document] if document else []
+            if pdf_path:
+                return [d for d in self._documents.values() if pdf_path in d.pdf_paths]
+            return list(self._documents.values())
+
+    def _search_document(self, document: _LocalDocument, vector: np.ndarray, limit: int):
+        with self._lock:
+            # A rewrite replaces the shard list under the lock; score against a consistent snapshot
+            shards = list(document.shards)
+            ivf = None
+            if document.size >= self.ann_threshold:
+                if document.ivf is None:
+                    document.ivf = _IVFIndex(document.matrix(), list(document.rows()), self.nprobe)
+                ivf = document.ivf
+        if ivf is not None:
+            rows, scores = ivf.search(vector, limit)
+            return [(float(score), *ivf.rows[row]) for row, score in zip(rows, scores)]
+
+        # Brute force, shard by shard over the memory-mapped matrices
+        results = []
+        for shard in shards:
+            scores = np.asarray(shard.vectors, dtype=np.float32) @ vector
+            top = np.argpartition(-scores, min(limit, len(scores)) - 1)[:limit] if len(scores) > limit else np.arange(len(scores))
+            results.extend((float(scores[i]), shard.ids[i], shard.payloads[i]) for i in top)
+        return results
+
+    def search(self, vector, limit, pdf_path=None, doc_hash=None):
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        results = []
+        for document in self._candidates(pdf_path, doc_hash):
+            results.extend(self._search_document(document, vector, limit))
+        results.sort(key=lambda result: -result[0])
+        return [{"id": point_id, "score": score, "payload": payload} for score, point_id, payload in results[:limit]]
@@ -1,84 +1,224 @@
-from qdrant_client import QdrantClient
-from qdrant_client.http import models
-from sentence_transformers import SentenceTransformer
 from backend.config import QDRANT_URL, QDRANT_API_KEY, EMBEDDING_MODEL_NAME
+from backend.bm25 import BM25Index
+from backend.catalog import catalog
+from backend.metrics import registry as metrics, span, traced
+from backend.rerank import rerank
+from backend.resources import resources
+from backend.settings import (EMBED_BATCH_SIZE, INGEST_CACHE_SIZE, LOCAL_ANN_THRESHOLD, LOCAL_VECTOR_DTYPE, RERANK,
+                              QUERY_CACHE_SIZE, RETRIEVAL_CANDIDATES, RETRIEVAL_MODE, RRF_K, VECTOR_BACKEND,
+                              VECTOR_STORE_DIR)
+from backend.vector_backends import Hit, LocalBackend, QdrantBackend, VectorBackend
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Union
+import numpy as np
+import threading
 import uuid
 
-# Initialize Client
-client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+COLLECTION_NAME = "edumind_docs"
+EMBEDDING_DIMENSION = 384
+POINT_NAMESPACE = uuid.UUID("6f1c1d2e-3c5a-4f0b-9a57-2d3e8b7c4a10")
 
-# Initialize Embedding Model
-# Note: This might download the model on first run
-encoder = SentenceTransformer(EMBEDDING_MODEL_NAME)
+# Payload schema shared by every stored chunk:
+#   text, source, pdf_path, doc_hash, chunk_index, page_start, page_end, heading
 
-COLLECTION_NAME = "edumind_docs"
+def point_id(doc_hash: str, chunk_index: int) -> str:
+    """Deterministic point ID, so re-ingesting a document overwrites rather than duplicates"""
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{doc_hash}:{chunk_index}"))
+
+def _create_client():
+    from qdrant_client import QdrantClient
+    return QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+
+def _create_encoder():
+    # Imported here so that importing this module does not pull in torch
+    # Note: This might download the model on first run
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+def _warm_encoder(encoder):
+    # A dummy forward pass initialises torch kernels before the first real request
+    encoder.encode(["EduMind warm-up sentence"], show_progress_bar=False)
+
+resources.register("qdrant_client", _create_client, close=lambda client: client.close())
+resources.register("encoder", _create_encoder, warm=_warm_encoder)
+
+def get_client():
+    return resources.get("qdrant_client")
+
+def get_encoder():
+    return resources.get("encoder")
+
+def _create_backend() -> VectorBackend:
+    if VECTOR_BACKEND == "local":
+        return LocalBackend(VECTOR_STORE_DIR, dtype=LOCAL_VECTOR_DTYPE, ann_threshold=LOCAL_ANN_THRESHOLD)
+    return QdrantBackend(get_client, COLLECTION_NAME, EMBEDDING_DIMENSION)
+
+resources.register("vector_backend", _create_backend, warm=lambda backend: backend.warm(),
+                   close=lambda backend: backend.close())
+
+def get_backend() -> VectorBackend:
+    return resources.get("vector_backend")
 
 def ensure_collection():
-    try:
-        client.get_collection(COLLECTION_NAME)
-        # Try to create the index if it doesn't exist
-        try:
-            client.create_payload_index(
-                collection_name=COLLECTION_NAME,
-                field_name="pdf_path",
-                field_schema=models.PayloadSchemaType.KEYWORD
-            )
-            print("Created pdf_path index")
-        except Exception as e:
-            # Index might already exist
-            pass
-    except Exception:
-        # Create collection
-        client.create_collection(
-            collection_name=COLLECTION_NAME,
-            vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE),
-        )
-        # Create index for pdf_path
-        client.create_payload_index(
-            collection_name=COLLECTION_NAME,
-            field_name="pdf_path",
-            field_schema=models.PayloadSchemaType.KEYWORD
-        )
-        print("Created collection with pdf_path index")
-
-def add_documents(text_chunks: list[str], metadata: dict):
-    ensure_collection()
-    
-    points = []
-    for chunk in text_chunks:
-        vector = encoder.encode(chunk).tolist()
-        points.append(models.PointStruct(
-            id=str(uuid.uuid4()),
-            vector=vector,
-            payload={"text": chunk, **metadata}
-        ))
-    
-    client.upsert(
-        collection_name=COLLECTION_NAME,
-        points=points
-    )
-
-def search_documents(query: str, limit: int = 3, pdf_path: str = None):
-    ensure_collection()
-    query_vector = encoder.encode(query).tolist()
-    
-    # Build filter if pdf_path is provided
-    query_filter = None
-    if pdf_path:
-        query_filter = models.Filter(
-            must=[
-                models.FieldCondition(
-                    key="pdf_path",
-                    match=models.MatchValue(value=pdf_path)
-                )
-            ]
-        )
-    
-    hits = client.search(
-        collection_name=COLLECTION_NAME,
-        query_vector=query_vector,
-        query_filter=query_filter,
-        limit=limit
-    )
+    backend = get_backend()
+    if isinstance(backend, QdrantBackend):
+        backend.ensure_collection()
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+chunks_indexed = metrics.counter("edumind_chunks_indexed_total", "Chunks embedded and upserted")
+
+@traced("vector_store")
+def add_documents(text_chunks: Iterable[Union[str, dict]], metadata: dict, batch_size: int = EMBED_BATCH_SIZE,
+                  vector_sink: Optional[list] = None) -> list[str]:
+    """
+    Embed and upsert chunks; returns the point IDs that were written.
+    A chunk is either its text or a dict with "text" plus extra payload fields
+    (e.g. page numbers from backend.chunking), merged over metadata.
+    Chunks are consumed lazily, encoded one batch at a time as a single matrix
+    and upserted page by page, so memory stays bounded for any document size.
+    If vector_sink is given, each batch's embedding matrix is appended to it.
+    """
+    backend = get_backend()
+    encoder = get_encoder()
     
-    return [hit.payload for hit in hits]
+    point_ids = []
+    doc_hash = metadata.get("doc_hash")
+    for batch in _batches(text_chunks, batch_size):
+        batch = [chunk if isinstance(chunk, dict) else {"text": chunk} for chunk in batch]
+        texts = [chunk["text"] for chunk in batch]
+        with span("encoder", "encode_batch"):
+            vectors = encoder.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+        vectors = vectors.astype(np.float32)
+        if vector_sink is not None:
+            vector_sink.append(vectors)
+        if doc_hash:
+            ids = [point_id(doc_hash, chunk.get("chunk_index", len(point_ids) + i)) for i, chunk in enumerate(batch)]
+        else:
+            ids = [str(uuid.uuid4()) for _ in batch]
+        with span("vector_backend", "upsert"):
+            backend.upsert(ids, vectors, [{**metadata, **chunk} for chunk in batch])
+        chunks_indexed.inc(len(ids))
+        point_ids.extend(ids)
+    return point_ids
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _encode_normalized(normalized: str) -> np.ndarray:
+    # Only cache misses reach here, so this times actual encoder calls
+    with span("encoder", "encode_query"):
+        vector = np.asarray(get_encoder().encode(normalized), dtype=np.float32)
+    vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+    # Shared between callers through the cache, so it must not be modified in place
+    vector.flags.writeable = False
+    return vector
+
+def encode_query(query: str) -> np.ndarray:
+    """Normalized query embedding, cached on case- and whitespace-normalized text"""
+    return _encode_normalized(" ".join(query.lower().split()))
+
+def query_cache_stats() -> dict:
+    info = _encode_normalized.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "entries": info.currsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
+
+def search_hits(query: str, limit: int = 3, pdf_path: str = None, doc_hash: str = None) -> List[Hit]:
+    """Dense search returning ids and scores alongside payloads"""
+    vector = encode_query(query)
+    with span("vector_backend", "search"):
+        return get_backend().search(vector, limit, pdf_path=pdf_path, doc_hash=doc_hash)
+
+# BM25 rebuilt from stored chunks for documents whose ingestion is not cached
+# in this process (after a restart, or on the chat path): doc_hash -> (index, ids, payloads)
+_stored_indexes: "OrderedDict[str, tuple]" = OrderedDict()
+_stored_indexes_lock = threading.Lock()
+
+def _stored_lexical_index(doc_hash: str) -> Optional[tuple]:
+    """BM25 over a catalogued document's stored chunks, loaded once and kept in an LRU"""
+    entry = catalog.get(doc_hash)
+    if entry is None or not entry["chunk_count"]:
+        # Unknown, deleted, or still being ingested for the first time
+        return None
+    with _stored_indexes_lock:
+        cached = _stored_indexes.get(doc_hash)
+        if cached is not None:
+            _stored_indexes.move_to_end(doc_hash)
+            return cached
+    with span("vector_backend", "load_chunks"):
+        points = get_backend().document_points(doc_hash)
+    if len(points) < entry["chunk_count"]:
+        return None
+    points.sort(key=lambda point: point[1].get("chunk_index", 0))
+    index = (BM25Index([payload.get("text", "") for _, payload in points]),
+             [point_id for point_id, _ in points], [payload for _, payload in points])
+    with _stored_indexes_lock:
+        _stored_indexes[doc_hash] = index
+        while len(_stored_indexes) > INGEST_CACHE_SIZE:
+            _stored_indexes.popitem(last=False)
+    return index
+
+def forget_lexical_index(doc_hash: str):
+    with _stored_indexes_lock:
+        _stored_indexes.pop(doc_hash, None)
+
+def _lexical_hits(query: str, limit: int, doc_hash: Optional[str]) -> List[Hit]:
+    """BM25 hits from the document's ingestion-time index, or one rebuilt from its stored chunks"""
+    if not doc_hash:
+        return []
+    from backend.ingestion import registry
+    doc = registry.get(doc_hash)
+    if doc is not None and doc.get("bm25") is not None:
+        base = {"source": doc["pdf_path"], "pdf_path": doc["pdf_path"], "doc_hash": doc_hash}
+        return [
+            {"id": doc["point_ids"][row], "score": score, "payload": {**base, **doc["chunk_records"][row]}}
+            for row, score in doc["bm25"].search(query, limit)
+        ]
+    stored = _stored_lexical_index(doc_hash)
+    if stored is None:
+        return []
+    index, ids, payloads = stored
+    return [{"id": ids[row], "score": score, "payload": payloads[row]} for row, score in index.search(query, limit)]
+
+def reciprocal_rank_fusion(rankings: List[List[Hit]], k: int = RRF_K) -> List[Hit]:
+    """Merge ranked hit lists: each hit scores the sum of 1 / (k + rank) over the lists it appears in"""
+    fused: dict = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            entry = fused.setdefault(hit["id"], {"id": hit["id"], "score": 0.0, "payload": hit["payload"]})
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: -hit["score"])
+
+@traced("vector_store")
+def search_documents(query: str, limit: int = 3, pdf_path: str = None, doc_hash: str = None,
+                     mode: str = RETRIEVAL_MODE):
+    """
+    Payloads of the chunks most relevant to query.
+    In hybrid mode dense and BM25 candidates are fused by reciprocal rank;
+    BM25 needs doc_hash (matches the same content under any filename), while
+    pdf_path is the legacy dense-only filter. Optionally cross-encoder reranked.
+    """
+    if doc_hash:
+        catalog.touch(doc_hash)
+    candidates = max(limit, RETRIEVAL_CANDIDATES) if mode == "hybrid" or RERANK else limit
+    hits = search_hits(query, candidates, pdf_path=pdf_path, doc_hash=doc_hash)
+    if mode == "hybrid":
+        lexical = _lexical_hits(query, candidates, doc_hash)
+        if lexical:
+            hits = reciprocal_rank_fusion([hits, lexical])
+    payloads = [hit["payload"] for hit in hits[:candidates]]
+    if RERANK:
+        with span("rerank", "rerank"):
+            payloads = rerank(query, payloads)
+    return payloads[:limit]
@@ -0,0 +1,6 @@
+"""
+Offline benchmarks for the EduMind pipeline.
+Gemini is replaced by a deterministic fake model, vectors go to the embedded
+local index, and inputs are synthetic PDFs, so timings measure this code
+rather than the network. Run with `python -m benchmarks.run`.
+"""
@@ -0,0 +1,88 @@
+"""
+Synthetic PDF corpus.
+Pages carry numbered section headings, several topics' worth of sentences and
+an occasional formula, generated from a fixed seed so every run parses the
+same bytes.
+"""
+
+import os
+import random
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+TOPICS = {
+    "Photosynthesis": ["chlorophyll absorbs light energy", "glucose is produced from carbon dioxide and water",
+                       "the Calvin cycle fixes carbon", "oxygen is released as a by-product"],
+    "Cell Structure": ["mitochondria produce ATP", "the nucleus stores genetic material",
+                       "ribosomes assemble proteins", "the cell membrane controls transport"],
+    "Newtonian Mechanics": ["force equals mass times acceleration", "momentum is conserved in collisions",
+                            "friction opposes relative motion", "work is force applied over a distance"],
+    "Algebra": ["a quadratic equation has at most two real roots", "the discriminant decides the number of roots",
+                "linear functions have a constant slope", "exponents multiply when powers are raised"],
+    "Chemical Bonding": ["ionic bonds transfer electrons", "covalent bonds share electron pairs",
+                         "electronegativity differences polarize bonds", "metallic bonds form an electron sea"],
+}
+
+FORMULAS = ["x^2 - 5x + 6 = 0", "F = m*a", "E = m*c^2", "6CO2 + 6H2O -> C6H12O6 + 6O2", "p = m*v"]
+
+QUERIES = [
+    "How does chlorophyll absorb light?",
+    "What does the Calvin cycle do?",
+    "Which organelle produces ATP?",
+    "State Newton's second law",
+    "When is momentum conserved?",
+    "How many roots can a quadratic have?",
+    "What decides the number of roots?",
+    "Difference between ionic and covalent bonds",
+    "x^2 - 5x + 6 = 0",
+    "What is electronegativity?",
+]
+
+
+def _sentence(rng: random.Random, topic: str) -> str:
+    fact = rng.choice(TOPICS[topic])
+    lead = rng.choice(["In this section,", "Students should note that", "It follows that", "Experiments show that"])
+    return f"{lead} {fact}."
+
+
+def make_pdf(path: str, pages: int, seed: int = 0) -> str:
+    """Write a synthetic textbook of the given page count"""
+    rng = random.Random(seed)
+    topics = list(TOPICS)
+    doc = canvas.Canvas(path, pagesize=A4)
+    section = 0
+    for page in range(pages):
+        y = 800
+        topic = topics[(page // 3) % len(topics)]
+        if page % 3 == 0:
+            section += 1
+            doc.setFont("Helvetica-Bold", 14)
+            doc.drawString(50, y, f"{section}. {topic}")
+            y -= 24
+        doc.setFont("Helvetica", 10)
+        for line in range(40):
+            if line % 12 == 11:
+                text = f"Worked example: {rng.choice(FORMULAS)}"
+            else:
+                text = _sentence(rng, topic)
+            doc.drawString(50, y, text)
+            y -= 18
+            if y < 60:
+                break
+        doc.drawString(290, 30, str(page + 1))
+        doc.showPage()
+    doc.save()
+    return path
+
+
+def corpus(directory: str, sizes) -> dict:
+    """Page count -> PDF path, generating only the files not already present"""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for pages in sizes:
+        path = os.path.join(directory, f"synthetic_{pages}p.pdf")
+        if not os.path.exists(path):
+            make_pdf(path, pages)
+        paths[pages] = path
+    return paths
@@ -0,0 +1,130 @@
+"""
+Deterministic stand-ins for the external services.
+FakeModel takes the place of the Gemini GenerativeModel underneath
+GeminiClient, so the client, response cache and JSON parsing still run;
+HashingEncoder replaces the sentence-transformer with a bag-of-words hash.
+"""
+
+import asyncio
+import hashlib
+import importlib.util
+import json
+import re
+import sys
+import time
+import types
+
+import numpy as np
+
+EMBEDDING_DIMENSION = 384
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+
+def _mcq(seed: str, i: int, difficulty: str) -> dict:
+    options = [f"Option {seed[:6]}-{i}-{letter}" for letter in "ABCD"]
+    return {
+        "id": i + 1,
+        "text": f"Synthetic question {seed[:8]}-{i}: which statement matches the text?",
+        "options": options,
+        "correct_answer": options[i % 4],
+        "explanation": "Derived from the synthetic context.",
+        "difficulty": difficulty,
+        "type": "MCQ",
+        "topic": f"Topic {i % 3 + 1}",
+    }
+
+
+def fake_completion(prompt: str) -> str:
+    """A plausible, deterministic reply for each prompt the agents send"""
+    seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    if "valid JSON" not in prompt:
+        return f"Synthetic answer {seed[:12]}. The document explains the requested concept step by step."
+    if "subjective questions" in prompt:
+        return json.dumps([{
+            "id": 100 + i,
+            "text": f"Explain concept {seed[:6]}-{i} in your own words.",
+            "options": None,
+            "correct_answer": "Key points from the synthetic context",
+            "explanation": "Covers the main idea.",
+            "difficulty": "Hard",
+            "type": "Subjective",
+            "topic": "General",
+        } for i in range(3)])
+    count = re.search(r"generate (\d+)", prompt)
+    difficulty = re.search(r"Difficulty level: (Easy|Medium|Hard)", prompt)
+    questions = [_mcq(seed, i, difficulty.group(1) if difficulty else "Medium")
+                 for i in range(int(count.group(1)) if count else 5)]
+    return json.dumps(questions)
+
+
+class FakeModel:
+    """GenerativeModel look-alike with an optional fixed latency per call"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+
+    def generate_content(self, prompt, request_options=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeResponse(fake_completion(prompt))
+
+    async def generate_content_async(self, prompt, stream: bool = False, request_options=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = FakeResponse(fake_completion(prompt))
+        if not stream:
+            return response
+
+        async def chunks():
+            for word in response.text.split(" "):
+                yield FakeResponse(word + " ")
+        return chunks()
+
+
+class HashingEncoder:
+    """SentenceTransformer look-alike: normalized hashed bag of words"""
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return EMBEDDING_DIMENSION
+
+    def encode(self, texts, **kwargs):
+        single = isinstance(texts, str)
+        rows = np.zeros((1 if single else len(texts), EMBEDDING_DIMENSION), dtype=np.float32)
+        for row, text in zip(rows, [texts] if single else texts):
+            for word in re.findall(r"\w+", text.lower()):
+                row[int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest(), "little") % EMBEDDING_DIMENSION] += 1.0
+            norm = np.linalg.norm(row)
+            if norm:
+                row /= norm
+        return rows[0] if single else rows
+
+
+def install_config():
+    """Placeholder backend.config when the real one is absent; the fakes never use its values"""
+    if "backend.config" in sys.modules or importlib.util.find_spec("backend.config") is not None:
+        return
+    config = types.ModuleType("backend.config")
+    config.GEMINI_API_KEY = "benchmark"
+    config.GEMINI_MODEL_NAME = "benchmark-fake"
+    config.QDRANT_URL = "http://localhost:6333"
+    config.QDRANT_API_KEY = None
+    config.EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+    sys.modules["backend.config"] = config
+
+
+def install(llm_latency_ms: float = 0.0, real_encoder: bool = False, memory_qdrant: bool = False):
+    """Swap the fakes into the already configured backend"""
+    # The owning modules register their resources on import, so they are imported before being overridden
+    from backend import llm, vector_store
+    from backend.resources import resources
+    llm.client.model = FakeModel(llm_latency_ms)
+    if not real_encoder:
+        resources.register("encoder", HashingEncoder)
+    if memory_qdrant:
+        from qdrant_client import QdrantClient
+        resources.register("qdrant_client", lambda: QdrantClient(":memory:"), close=lambda client: client.close())
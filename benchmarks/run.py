@@ -0,0 +1,251 @@
+"""
+Time the pipeline offline and compare against a stored baseline.
+Usage:
+    python -m benchmarks.run                          # 10, 100 and 1000 page documents
+    python -m benchmarks.run --sizes 10,100 --repeat 5
+    python -m benchmarks.run --only search,plot       # cases whose name contains a filter
+    python -m benchmarks.run --save-baseline          # record this machine's numbers
+Exits with status 1 when a case's median is slower than the baseline by more
+than --tolerance (and by more than --floor-ms).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Callable, Dict, List
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def configure(workdir: str, backend: str):
+    """Point every store at the scratch directory; must run before backend modules are imported"""
+    os.environ.update({
+        "EDUMIND_VECTOR_BACKEND": "local" if backend == "local" else "qdrant",
+        "EDUMIND_VECTOR_STORE_DIR": os.path.join(workdir, "vectors"),
+        "EDUMIND_CATALOG_DB": os.path.join(workdir, "catalog.db"),
+        "EDUMIND_QUESTION_BANK_DB": os.path.join(workdir, "question_bank.db"),
+        "EDUMIND_ANALYTICS_DB": os.path.join(workdir, "analytics.db"),
+        # Every graph run reaches the (fake) model, and no background work competes with the timings
+        "EDUMIND_LLM_CACHE_SIZE": "0",
+        "EDUMIND_LLM_CACHE_DB": "",
+        "EDUMIND_LLM_SEMANTIC_CACHE": "0",
+        "EDUMIND_QUESTION_BANK": "0",
+        "EDUMIND_DOC_TTL_SECONDS": "0",
+    })
+
+
+def measure(run: Callable, repeat: int, setup: Callable[[], None] = None) -> dict:
+    """
+    Time run() `repeat` times, calling setup() untimed before each. When run()
+    returns an int count, the per-item time is reported (e.g. per query).
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        items = run()
+        elapsed = time.perf_counter() - started
+        samples.append(elapsed * 1000 / (items if isinstance(items, int) and items > 0 else 1))
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "max_ms": max(samples),
+        "runs": repeat,
+    }
+
+
+def _questions(count: int) -> List[dict]:
+    from benchmarks.fakes import _mcq
+    return [_mcq("worksheet", i, "Medium") for i in range(count)]
+
+
+def cases(sizes: List[int], workdir: str) -> Dict[str, tuple]:
+    """
+    Case name -> (run, setup). Nothing is generated or ingested here: a size's
+    PDF is made and ingested by the first selected case that needs it, untimed.
+    """
+    from backend import student_agent, teacher_agent
+    from backend.ingestion import registry
+    from backend.maintenance import delete_document
+    from backend.tools import diagram_generator, pdf_exporter, plot_generator
+    from backend.vector_store import _encode_normalized, add_documents, search_documents
+    from benchmarks.corpus import QUERIES, corpus
+
+    table = {}
+    for pages in sorted(sizes):
+        path = os.path.join(workdir, "pdfs", f"synthetic_{pages}p.pdf")
+        doc = {}
+
+        def prepare(pages=pages, path=path, doc=doc):
+            if not doc:
+                started = time.perf_counter()
+                corpus(os.path.dirname(path), [pages])
+                doc.update(registry.ingest(path))
+                print(f"  ({pages}-page document ready in {time.perf_counter() - started:.1f}s)")
+
+        def cold_ingest(path=path, prepare=prepare):
+            prepare()
+            delete_document(registry.hash_for_path(path))
+
+        table[f"extract_pdf_node[{pages}p]"] = (
+            lambda path=path: teacher_agent.extract_pdf_node({"pdf_path": path}), cold_ingest)
+
+        bench_hash = f"benchmark-add-{pages}"
+
+        def drop_copy(bench_hash=bench_hash, prepare=prepare):
+            prepare()
+            delete_document(bench_hash)
+
+        table[f"add_documents[{pages}p]"] = (
+            lambda doc=doc, bench_hash=bench_hash: add_documents(
+                doc["chunk_records"], {"source": doc["pdf_path"], "pdf_path": doc["pdf_path"], "doc_hash": bench_hash}),
+            drop_copy)
+
+        def search(doc=doc):
+            for query in QUERIES:
+                search_documents(query, limit=3, pdf_path=doc["pdf_path"], doc_hash=doc["doc_hash"])
+            return len(QUERIES)
+
+        def fresh_queries(prepare=prepare):
+            prepare()
+            # Query embeddings are cleared so each pass pays for encoding, as a new question would
+            _encode_normalized.cache_clear()
+
+        table[f"search_documents_per_query[{pages}p]"] = (search, fresh_queries)
+
+        base_state = {"pdf_path": path, "doc_hash": "", "extracted_text": ""}
+        teacher_state = {**base_state, "topics": [], "topic_contexts": {}, "mcq_count": 10,
+                         "include_subjective": True, "generated_questions": [],
+                         "worksheet_markdown": "", "answer_key_markdown": ""}
+        student_state = {**base_state, "student_id": "", "current_topic": "General", "quiz_history": [],
+                         "current_question": None, "weak_areas": [], "learning_path": [], "num_questions": 5,
+                         "difficulty": "Medium", "time_limit": 600, "generated_questions": [],
+                         "current_question_index": 0, "score": 0, "total_time_taken": 0}
+        table[f"teacher_graph[{pages}p]"] = (
+            lambda state=teacher_state: teacher_agent.teacher_graph.invoke(dict(state)), prepare)
+        table[f"student_graph[{pages}p]"] = (
+            lambda state=student_state: student_agent.student_graph.invoke(dict(state)), prepare)
+
+    questions = _questions(20)
+    output_dir = os.path.join(workdir, "worksheets")
+    table["create_worksheet_pdf[20q]"] = (
+        lambda: pdf_exporter.create_worksheet_pdf(
+            "Benchmark Worksheet", questions, answer_key=True,
+            output_path=os.path.join(output_dir, f"{uuid.uuid4().hex}.pdf")),
+        None)
+    # Unique titles miss the image cache, so every run renders
+    table["plot_function"] = (
+        lambda: plot_generator.create_function_plot("sin(x) * x**2", (-10, 10), title=uuid.uuid4().hex), None)
+    table["flowchart[6 steps]"] = (
+        lambda: diagram_generator.create_simple_flowchart(
+            [f"Step {i}" for i in range(6)], title=uuid.uuid4().hex), None)
+    return table
+
+
+def compare(results: dict, baseline: dict, tolerance: float, floor_ms: float) -> List[str]:
+    """Names of cases slower than their baseline median beyond tolerance and floor"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        slower = result["median_ms"] - base["median_ms"]
+        if result["median_ms"] > base["median_ms"] * (1 + tolerance) and slower > floor_ms:
+            regressions.append(name)
+    return regressions
+
+
+def report(results: dict, baseline: dict, regressions: List[str]):
+    print(f"\n{'case':<42} {'median ms':>11} {'min ms':>10} {'baseline':>10} {'change':>8}")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        base_text = f"{base['median_ms']:10.2f}" if base else f"{'-':>10}"
+        change = f"{(result['median_ms'] / base['median_ms'] - 1):+8.0%}" if base and base["median_ms"] else f"{'':>8}"
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<42} {result['median_ms']:11.2f} {result['min_ms']:10.2f} {base_text} {change}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Offline pipeline benchmarks")
+    parser.add_argument("--sizes", default="10,100,1000", help="Synthetic PDF page counts (comma-separated)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", default="", help="Run cases whose name contains one of these (comma-separated)")
+    parser.add_argument("--backend", choices=["local", "qdrant-memory"], default="local",
+                        help="Embedded local index or an in-process Qdrant (QdrantClient(':memory:'))")
+    parser.add_argument("--real-encoder", action="store_true", help="Use the sentence-transformer instead of hashed vectors")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Fixed delay per fake LLM call")
+    parser.add_argument("--workdir", default="", help="Scratch directory (default: a new temp dir)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown as a fraction of the baseline")
+    parser.add_argument("--floor-ms", type=float, default=5.0, help="Slowdowns smaller than this are never regressions")
+    parser.add_argument("--json", default="", help="Also write results to this file")
+    args = parser.parse_args()
+
+    # Resolved before the run changes into the scratch directory
+    args.baseline = os.path.abspath(args.baseline)
+    args.json = os.path.abspath(args.json) if args.json else ""
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="edumind-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    configure(workdir, args.backend)
+
+    from benchmarks import fakes
+    fakes.install_config()
+    fakes.install(args.llm_latency_ms, args.real_encoder, memory_qdrant=args.backend == "qdrant-memory")
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    config = {"backend": args.backend, "encoder": "sentence-transformer" if args.real_encoder else "hashed",
+              "llm_latency_ms": args.llm_latency_ms}
+    print(f"Benchmark workdir: {workdir}  config: {config}")
+
+    # Generated worksheets and other relative outputs stay in the scratch directory
+    os.makedirs(os.path.join(workdir, "static", "generated"), exist_ok=True)
+    os.chdir(workdir)
+
+    filters = [f.strip() for f in args.only.split(",") if f.strip()]
+    results = {}
+    for name, (run, setup) in cases(sizes, workdir).items():
+        if filters and not any(f in name for f in filters):
+            continue
+        results[name] = measure(run, args.repeat, setup)
+        print(f"  {name}: {results[name]['median_ms']:.2f} ms")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print(f"Baseline was recorded with {baseline.get('config')}; not comparing")
+            baseline = {}
+    regressions = compare(results, baseline, args.tolerance, args.floor_ms)
+    report(results, baseline, regressions)
+
+    payload = {"config": config, "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+    if args.save_baseline:
+        # Keep baseline numbers for cases this run skipped
+        if baseline:
+            payload["results"] = {**baseline.get("results", {}), **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    from backend import pdf_extract, pdf_render, plotting
+    pdf_extract.shutdown()
+    pdf_render.shutdown()
+    plotting.shutdown()
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,19 @@
-from fastapi import FastAPI, Request, UploadFile, File
+import time
+_BOOT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 import uvicorn
+import asyncio
+import json
 import os
-import shutil
+import uuid
+from backend.concurrency import run_in_pool
+from backend.metrics import registry as metrics_registry, reset_trace_id, set_trace_id, trace_spans
+from backend.resources import resources
+from backend.settings import DOC_EVICT_INTERVAL_SECONDS, DOC_TTL_SECONDS, RERANK, TRACING, UPLOAD_PREINGEST, WARMUP
 
 app = FastAPI(title="EduMind Agent")
 
@@ -14,20 +23,120 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Templates
 templates = Jinja2Templates(directory="templates")
 
+# Boot, warm-up and first-request latencies, reported at /api/stats
+startup_timings = {}
+first_request_timings = {}
+
+# Long-lived tasks started at startup and cancelled at shutdown
+background_tasks = {}
+
+def warm_up():
+    # Importing the agents pulls in LangGraph, Gemini and the vector store modules
+    import backend.teacher_agent, backend.student_agent
+    # The vector backend pulls in the Qdrant client only when it is the one configured
+    resources.warm_up(["encoder", "vector_backend"] + (["reranker"] if RERANK else []))
+
+@app.on_event("startup")
+async def startup():
+    startup_timings["boot_seconds"] = time.perf_counter() - _BOOT_STARTED
+    if WARMUP:
+        started = time.perf_counter()
+        await run_in_pool(warm_up)
+        startup_timings["warm_up_seconds"] = time.perf_counter() - started
+    print(f"Startup timings: {startup_timings}")
+    if DOC_TTL_SECONDS:
+        background_tasks["eviction"] = asyncio.create_task(evict_periodically())
+
+async def evict_periodically():
+    """Evict documents unused past their TTL off the request path, at startup and every DOC_EVICT_INTERVAL_SECONDS"""
+    while True:
+        await run_in_pool(evict_unused_documents)
+        if DOC_EVICT_INTERVAL_SECONDS <= 0:
+            return
+        await asyncio.sleep(DOC_EVICT_INTERVAL_SECONDS)
+
+def evict_unused_documents():
+    from backend.maintenance import evict_unused
+    try:
+        evict_unused()
+    except Exception as e:
+        print(f"Document eviction failed: {e}")
+
+@app.middleware("http")
+async def record_first_request(request: Request, call_next):
+    key = f"{request.method} {request.url.path}"
+    if not request.url.path.startswith("/api/") or key in first_request_timings:
+        return await call_next(request)
+    started = time.perf_counter()
+    response = await call_next(request)
+    first_request_timings.setdefault(key, time.perf_counter() - started)
+    return response
+
+http_seconds = metrics_registry.histogram(
+    "edumind_http_request_seconds", "HTTP request latency by route", ("method", "route", "status"))
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # A caller-supplied X-Trace-Id is always honoured; otherwise one is minted only with tracing on
+    trace_id = request.headers.get("x-trace-id") or (uuid.uuid4().hex if TRACING else None)
+    token = set_trace_id(trace_id)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        reset_trace_id(token)
+    # Label by route template, not raw path, so IDs in URLs don't multiply the series
+    route = request.scope.get("route")
+    http_seconds.observe(time.perf_counter() - started, method=request.method,
+                         route=getattr(route, "path", "unmatched"), status=response.status_code)
+    if trace_id:
+        response.headers["X-Trace-Id"] = trace_id
+    return response
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    for task in background_tasks.values():
+        task.cancel()
+    from backend import concurrency, pdf_extract, pdf_render, plotting, uploads
+    from backend.math_engine import engine as math_engine
+    from backend.question_bank import question_bank
+    from backend.jobs import job_manager
+    job_manager.shutdown()
+    question_bank.shutdown()
+    uploads.shutdown()
+    concurrency.shutdown()
+    pdf_extract.shutdown()
+    pdf_render.shutdown()
+    plotting.shutdown()
+    math_engine.shutdown()
+    resources.close_all()
+
+def write_text_file(path: str, content: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding='utf-8') as f:
+        f.write(content)
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
-    file_location = f"temp/{file.filename}"
-    os.makedirs("temp", exist_ok=True)
-    with open(file_location, "wb+") as file_object:
-        shutil.copyfileobj(file.file, file_object)
-    return {"filename": file.filename, "path": file_location}
+async def upload_file(request: Request):
+    """Stream a PDF to temp/{sha256}.pdf and start ingesting it; the returned filename names it in later calls"""
+    from backend.uploads import UploadError, UploadTooLarge, ingest_in_background, receive_pdf
+    try:
+        upload = await receive_pdf(request, "temp")
+    except UploadTooLarge as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=413)
+    except UploadError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+    if UPLOAD_PREINGEST:
+        ingest_in_background(upload["path"], upload["doc_hash"])
+    return upload
 
 @app.post("/api/generate-worksheet")
 async def generate_worksheet_endpoint(request: Request):
+    """Queue worksheet generation and return a job ID to poll at /api/jobs/{job_id}"""
     data = await request.json()
     filename = data.get("filename")
     mcq_count = int(data.get("mcq_count", 10))
@@ -36,12 +145,15 @@ async def generate_worksheet_endpoint(request: Request):
         return {"status": "error", "message": "No file selected"}
         
     from backend.teacher_agent import teacher_graph
+    from backend.jobs import job_manager
     
     # Initial state
     initial_state = {
         "pdf_path": f"temp/{filename}",
+        "doc_hash": "",
         "extracted_text": "",
         "topics": [],
+        "topic_contexts": {},
         "mcq_count": mcq_count,
         "include_subjective": True,
         "generated_questions": [],
@@ -49,21 +161,35 @@ async def generate_worksheet_endpoint(request: Request):
         "answer_key_markdown": ""
     }
     
-    # Run Graph
-    result = teacher_graph.invoke(initial_state)
+    job_id = job_manager.submit("worksheet", teacher_graph, initial_state, summarize_worksheet)
+    return {"status": "queued", "job_id": job_id, "status_url": f"/api/jobs/{job_id}"}
+
+def summarize_worksheet(state: dict, done: bool) -> dict:
+    """Client-facing worksheet job result: questions as soon as they exist, files once finished"""
+    result = {"questions": state.get("generated_questions", [])}
+    if not done:
+        return result
     
-    # Save generated worksheet markdown
-    md_output_path = "static/generated/worksheet.md"
-    os.makedirs("static/generated", exist_ok=True)
-    with open(md_output_path, "w", encoding='utf-8') as f:
-        f.write(result['worksheet_markdown'])
-        
-    return {
-        "status": "success", 
+    # Save generated worksheet markdown next to the PDF
+    pdf_path = state.get("pdf_path")
+    md_output_path = os.path.splitext(pdf_path)[0] + ".md" if pdf_path else "static/generated/worksheet.md"
+    write_text_file(md_output_path, state['worksheet_markdown'])
+    
+    result.update({
         "worksheet_url": f"/{md_output_path}",
-        "pdf_url": f"/{result['pdf_path']}" if result.get('pdf_path') else None,
-        "preview": result['worksheet_markdown'][:500] + "..."
-    }
+        "pdf_url": f"/{pdf_path}" if pdf_path else None,
+        "preview": state['worksheet_markdown'][:500] + "..."
+    })
+    return result
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    from backend.jobs import job_manager
+    
+    job = job_manager.get(job_id)
+    if job is None:
+        return JSONResponse({"status": "error", "message": "Unknown job"}, status_code=404)
+    return job
 
 @app.post("/api/student/start")
 async def start_student_session(request: Request):
@@ -72,14 +198,23 @@ async def start_student_session(request: Request):
     num_questions = int(data.get("num_questions", 5))
     difficulty = data.get("difficulty", "Medium")
     time_limit = int(data.get("time_limit", 600))  # Default 10 minutes
+    student_id = data.get("student_id") or ""
     
     if not filename:
         return {"status": "error", "message": "No file selected"}
 
     from backend.student_agent import student_graph
+    from backend.gemini_client import LLMError
+    from backend.question_bank import normalize_difficulty
+    try:
+        difficulty = normalize_difficulty(difficulty)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
     
     initial_state = {
+        "student_id": student_id,
         "pdf_path": f"temp/{filename}",
+        "doc_hash": "",
         "extracted_text": "",
         "current_topic": "General",
         "quiz_history": [],
@@ -96,70 +231,164 @@ async def start_student_session(request: Request):
     }
     
     # Run Graph to generate all questions
-    result = student_graph.invoke(initial_state)
+    try:
+        result = await run_in_pool(student_graph.invoke, initial_state)
+    except LLMError as e:
+        return {"status": "error", "message": f"Question generation is temporarily unavailable: {e}"}
+    
+    # Answer keys stay in the server-side session; the client only sees the questions
+    from backend.sessions import session_store
+    session = session_store.create(result['generated_questions'], pdf_path=initial_state["pdf_path"],
+                                   doc_hash=result.get('doc_hash', ""), student_id=student_id,
+                                   difficulty=difficulty, time_limit=time_limit)
     
     return {
         "status": "success",
-        "questions": result['generated_questions'],
+        "session_id": session.session_id,
+        "questions": session.public_questions(),
         "time_limit": time_limit,
         "num_questions": num_questions,
-        "difficulty": difficulty
+        "difficulty": difficulty,
+        "focus_topics": result.get('weak_areas', [])
     }
 
 @app.post("/api/student/submit-answer")
 async def submit_answer(request: Request):
+    """Grade one answer against the session's answer key and update the student's mastery"""
     data = await request.json()
-    question_id = data.get("question_id")
-    user_answer = data.get("user_answer")
-    correct_answer = data.get("correct_answer")
-    time_taken = data.get("time_taken", 0)
-    
-    is_correct = user_answer == correct_answer
+    from backend.sessions import session_store
+    from backend.analytics import learner_analytics
     
-    return {
-        "is_correct": is_correct,
-        "correct_answer": correct_answer
-    }
+    session = session_store.get(data.get("session_id"))
+    if session is None:
+        return JSONResponse({"status": "error", "message": "Unknown session"}, status_code=404)
+    result = session_store.record_answer(session.session_id, data.get("question_id"),
+                                         data.get("user_answer"), data.get("time_taken", 0))
+    if result is None:
+        return JSONResponse({"status": "error", "message": "Unknown question"}, status_code=404)
+    student_id = session.metadata.get("student_id")
+    # Only a question's first answer counts toward mastery; repeats return the stored result
+    if student_id and not result["already_answered"]:
+        topic = session.questions[str(data.get("question_id"))].get("topic")
+        await run_in_pool(learner_analytics.record, student_id, session.metadata.get("doc_hash", ""),
+                          topic, result["is_correct"])
+    return result
 
 @app.post("/api/student/finish-quiz")
 async def finish_quiz(request: Request):
+    """Score, time and weak areas, read from the totals kept as answers arrived"""
     data = await request.json()
-    quiz_results = data.get("results", [])
+    from backend.sessions import session_store
     
-    total_questions = len(quiz_results)
-    correct_answers = sum(1 for r in quiz_results if r.get("is_correct"))
-    score_percentage = (correct_answers / total_questions * 100) if total_questions > 0 else 0
-    total_time = sum(r.get("time_taken", 0) for r in quiz_results)
-    
-    # Analyze weak areas
-    weak_topics = {}
-    for r in quiz_results:
-        if not r.get("is_correct"):
-            topic = r.get("topic", "Unknown")
-            weak_topics[topic] = weak_topics.get(topic, 0) + 1
-    
-    weak_areas = sorted(weak_topics.items(), key=lambda x: x[1], reverse=True)
+    session = session_store.get(data.get("session_id"))
+    if session is None:
+        return JSONResponse({"status": "error", "message": "Unknown session"}, status_code=404)
+    response = {"status": "success", **session.summary()}
+    student_id = session.metadata.get("student_id")
+    if student_id:
+        from backend.analytics import learner_analytics
+        response["learning_path"] = await run_in_pool(learner_analytics.learning_path, student_id,
+                                                      session.metadata.get("doc_hash"))
+    return response
+
+@app.get("/api/student/progress")
+async def student_progress(student_id: str, filename: str = None):
+    """A student's topic mastery, weak areas and learning path, for one document or all of them"""
+    if filename and not os.path.exists(f"temp/{filename}"):
+        return JSONResponse({"status": "error", "message": "Unknown file"}, status_code=404)
+    # Hashing the PDF and the SQLite reads both block, so they run off the event loop
+    return await run_in_pool(_student_progress, student_id, filename)
+
+def _student_progress(student_id: str, filename: str = None) -> dict:
+    from backend.analytics import learner_analytics
+    from backend.ingestion import registry
     
+    doc_hash = registry.hash_for_path(f"temp/{filename}") if filename else None
     return {
         "status": "success",
-        "score": score_percentage,
-        "correct": correct_answers,
-        "total": total_questions,
-        "time_taken": total_time,
-        "weak_areas": [{"topic": topic, "mistakes": count} for topic, count in weak_areas[:3]]
+        "mastery": learner_analytics.mastery(student_id, doc_hash),
+        "weak_areas": [row["topic"] for row in learner_analytics.weak_topics(student_id, doc_hash)],
+        "learning_path": learner_analytics.learning_path(student_id, doc_hash)
     }
 
 @app.post("/api/chat")
 async def chat_endpoint(request: Request):
+    """
+    Chat with the tutor. Send {"stream": true} (or Accept: text/event-stream) to
+    receive Server-Sent Events: "token" chunks, "tool" results, then "done"
+    (or "error" if the model stream fails part-way).
+    """
     data = await request.json()
     query = data.get("query")
     filename = data.get("filename", "sample.pdf") # Default if not provided
+    pdf_path = f"temp/{filename}"
     
-    from backend.student_agent import chat_with_pdf
+    stream = data.get("stream") or "text/event-stream" in request.headers.get("accept", "")
+    if stream:
+        from backend.student_agent import astream_chat_with_pdf
+        
+        async def event_stream():
+            async for event, payload in astream_chat_with_pdf(query, pdf_path):
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        
+        return StreamingResponse(event_stream(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    
+    from backend.student_agent import achat_with_pdf
     
-    response_text = chat_with_pdf(query, f"temp/{filename}")
+    response_text = await achat_with_pdf(query, pdf_path)
     
     return {"response": response_text}
 
+def stats_sources() -> dict:
+    """Snapshot functions behind /api/stats, imported lazily so boot stays light"""
+    from backend.llm import cache_stats, client_stats
+    from backend.vector_store import query_cache_stats
+    from backend.plotting import cache_stats as plot_cache_stats
+    from backend.math_engine import engine as math_engine
+    from backend.sessions import session_store
+    from backend.question_bank import question_bank
+    return {
+        "llm_cache": cache_stats,
+        "llm_client": client_stats,
+        "query_cache": query_cache_stats,
+        "plot_cache": plot_cache_stats,
+        "math_engine": math_engine.snapshot,
+        "quiz_sessions": session_store.snapshot,
+        "question_bank": question_bank.snapshot,
+        "resources": resources.timings,
+        "startup": lambda: startup_timings,
+    }
+
+# The same snapshots as /api/stats, as gauges at /metrics
+for _name in ("llm_cache", "llm_client", "query_cache", "plot_cache", "math_engine",
+              "quiz_sessions", "question_bank", "resources", "startup"):
+    metrics_registry.register_collector(_name, lambda name=_name: stats_sources()[name]())
+
+@app.get("/api/stats")
+async def stats_endpoint():
+    """Cache, latency, token and startup counters"""
+    # The first call imports every module behind the stats and opens their stores
+    stats = await run_in_pool(lambda: {name: collect() for name, collect in stats_sources().items()})
+    stats["first_requests"] = first_request_timings
+    return stats
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of stage latencies, errors and the /api/stats counters"""
+    text = await run_in_pool(metrics_registry.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/traces/{trace_id}")
+async def trace_endpoint(trace_id: str):
+    """Spans recorded for one traced request, in completion order"""
+    spans = trace_spans(trace_id)
+    if spans is None:
+        return JSONResponse({"status": "error", "message": "Unknown trace"}, status_code=404)
+    by_stage = {}
+    for span in spans:
+        by_stage[span["stage"]] = by_stage.get(span["stage"], 0.0) + span["seconds"]
+    return {"trace_id": trace_id, "spans": spans, "seconds_by_stage": by_stage}
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
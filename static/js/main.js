@@ -7,6 +7,18 @@ let quizTimer = null;
 let questionStartTime = null;
 let totalTimeRemaining = 0;
 
+// Anonymous learner ID kept in the browser so mastery carries across quizzes
+function getStudentId() {
+    let id = localStorage.getItem('edumind_student_id');
+    if (!id) {
+        id = window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+        localStorage.setItem('edumind_student_id', id);
+    }
+    return id;
+}
+
 function switchMode(mode) {
     document.querySelectorAll('.nav-item').forEach(btn => btn.classList.remove('active'));
     event.currentTarget.classList.add('active');
@@ -35,6 +47,7 @@ function setupFileUpload(id, infoId, type) {
                 body: formData
             });
             const data = await res.json();
+            if (!res.ok) throw new Error(data.message || res.statusText);
             if (type === 'teacher') currentTeacherFile = data.filename;
             if (type === 'student') currentStudentFile = data.filename;
             console.log(`Uploaded ${type} file:`, data.filename);
@@ -68,6 +81,19 @@ function setupFileUpload(id, infoId, type) {
 setupFileUpload('teacher-file', 'teacher-file-info', 'teacher');
 setupFileUpload('student-file', 'student-file-info', 'student');
 
+// Background jobs: poll until the job completes or fails
+async function pollJob(statusUrl, onProgress, intervalMs = 1000) {
+    while (true) {
+        const res = await fetch(statusUrl);
+        const job = await res.json();
+        if (job.status === 'completed' || job.status === 'failed' || job.status === 'error') {
+            return job;
+        }
+        if (onProgress) onProgress(job);
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
 // Teacher Mode
 async function generateWorksheet() {
     if (!currentTeacherFile) {
@@ -91,9 +117,20 @@ async function generateWorksheet() {
                 mcq_count: mcqCount
             })
         });
-        const data = await response.json();
+        const queued = await response.json();
 
-        if (data.status === 'success') {
+        if (queued.status !== 'queued') {
+            alert('Generation failed: ' + queued.message);
+            return;
+        }
+
+        const data = await pollJob(queued.status_url, (job) => {
+            const percent = Math.round(job.progress * 100);
+            btn.innerHTML = `<i data-lucide="loader-2" class="spin"></i> Generating... ${percent}%`;
+            lucide.createIcons();
+        });
+
+        if (data.status === 'completed') {
             const resultsDiv = document.getElementById('teacher-results');
             resultsDiv.classList.remove('hidden');
 
@@ -102,17 +139,17 @@ async function generateWorksheet() {
                 <div class="result-item">
                     <i data-lucide="file-text"></i>
                     <span>Worksheet.pdf</span>
-                    <a href="${data.pdf_url}" download class="btn-sm">Download PDF</a>
+                    <a href="${data.result.pdf_url}" download class="btn-sm">Download PDF</a>
                 </div>
                 <div class="result-item">
                     <i data-lucide="file-text"></i>
                     <span>Worksheet.md</span>
-                    <a href="${data.worksheet_url}" download class="btn-sm">Download Markdown</a>
+                    <a href="${data.result.worksheet_url}" download class="btn-sm">Download Markdown</a>
                 </div>
             `;
             lucide.createIcons();
         } else {
-            alert('Generation failed: ' + data.message);
+            alert('Generation failed: ' + (data.error || data.message));
         }
     } catch (e) {
         console.error(e);
@@ -146,6 +183,7 @@ async function startStudentSession() {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 filename: currentStudentFile,
+                student_id: getStudentId(),
                 num_questions: numQuestions,
                 difficulty: difficulty,
                 time_limit: timeLimit * 60
@@ -244,33 +282,27 @@ async function submitAnswer() {
     const question = quizData.questions[currentQuestionIndex];
     const timeTaken = Math.floor((Date.now() - questionStartTime) / 1000);
 
-    const normalizeAnswer = (answer) => {
-        return answer.replace(/^[A-D]\.\s*/i, '').trim().toLowerCase();
-    };
-
-    const normalizedUserAnswer = normalizeAnswer(userAnswer);
-    const normalizedCorrectAnswer = normalizeAnswer(question.correct_answer);
-
     try {
+        // Graded on the server against the session's answer key
         const response = await fetch('/api/student/submit-answer', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
+                session_id: quizData.session_id,
                 question_id: question.id,
-                user_answer: normalizedUserAnswer,
-                correct_answer: normalizedCorrectAnswer,
+                user_answer: userAnswer,
                 time_taken: timeTaken
             })
         });
         const data = await response.json();
+        if (!response.ok) throw new Error(data.message);
 
         quizResults.push({
             question_id: question.id,
-            topic: question.topic,
             is_correct: data.is_correct,
-            time_taken: timeTaken,
             user_answer: userAnswer,
-            correct_answer: question.correct_answer
+            correct_answer: data.correct_answer,
+            explanation: data.explanation
         });
 
         if (data.is_correct) {
@@ -312,7 +344,7 @@ async function finishQuiz() {
         const response = await fetch('/api/student/finish-quiz', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ results: quizResults })
+            body: JSON.stringify({ session_id: quizData.session_id })
         });
         const data = await response.json();
 
@@ -337,7 +369,7 @@ function showResults(data) {
                 <p><strong>Your Answer:</strong> ${result.user_answer}</p>
                 ${!isCorrect ? `<p><strong>Correct Answer:</strong> ${result.correct_answer}</p>` : ''}
                 <div class="explanation">
-                    <strong>Explanation:</strong> ${question.explanation || 'No explanation available.'}
+                    <strong>Explanation:</strong> ${result.explanation || 'No explanation available.'}
                 </div>
             </div>
         `;
@@ -367,6 +399,16 @@ function showResults(data) {
                     `).join('')}
                 </div>
             ` : ''}
+            ${data.learning_path && data.learning_path.length > 0 ? `
+                <div style="margin-top: 2rem; text-align: left; max-width: 400px; margin-left: auto; margin-right: auto;">
+                    <h3 style="margin-bottom: 1rem;">Next Steps:</h3>
+                    ${data.learning_path.map(step => `
+                        <div style="padding: 0.75rem; background: rgba(99, 102, 241, 0.1); border-radius: 0.5rem; margin-bottom: 0.5rem;">
+                            ${step}
+                        </div>
+                    `).join('')}
+                </div>
+            ` : ''}
         </div>
         ${feedbackHTML}
     `;
@@ -390,66 +432,125 @@ async function sendChatMessage() {
     input.value = '';
     chatWindow.scrollTop = chatWindow.scrollHeight;
 
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'chat-message ai';
+    messageDiv.innerHTML = '<p></p><div class="tool-results"></div>';
+    chatWindow.appendChild(messageDiv);
+    const textEl = messageDiv.querySelector('p');
+    const toolsEl = messageDiv.querySelector('.tool-results');
+
     try {
         const response = await fetch('/api/chat', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
             body: JSON.stringify({
                 query: text,
-                filename: currentStudentFile
+                filename: currentStudentFile,
+                stream: true
             })
         });
-        const data = await response.json();
 
-        let responseText = data.response;
-        let followUpHtml = '';
+        let streamedText = '';
+        await readEventStream(response, (event, data) => {
+            if (event === 'token') {
+                streamedText += data.text;
+                textEl.innerHTML = streamedText.replace(/\n/g, '<br>');
+            } else if (event === 'tool') {
+                // Tool inputs come from model output, so they are escaped before going into HTML
+                if (data.kind === 'plot') {
+                    toolsEl.innerHTML += `<img class="tool-plot" alt="Plot of ${escapeHtml(data.input)}" src="data:${escapeHtml(data.mime_type || 'image/png')};base64,${escapeHtml(data.image_base64)}">`;
+                } else if (data.kind === 'solution') {
+                    toolsEl.innerHTML += `<p><strong>Solution:</strong> ${escapeHtml(data.solutions.join(', '))}</p>`;
+                }
+            } else if (event === 'done') {
+                renderChatAnswer(messageDiv, textEl, data.answer);
+            } else if (event === 'error') {
+                // The stream broke part-way: keep the partial text and say it is incomplete
+                const errorEl = document.createElement('p');
+                errorEl.style.color = 'red';
+                errorEl.textContent = data.message;
+                messageDiv.appendChild(errorEl);
+            }
+            chatWindow.scrollTop = chatWindow.scrollHeight;
+        });
+    } catch (e) {
+        console.error(e);
+        textEl.innerHTML = '<span style="color:red">Error connecting to tutor.</span>';
+    }
+}
 
-        if (responseText.includes('Follow-up Questions:')) {
-            const parts = responseText.split('Follow-up Questions:');
-            const mainAnswer = parts[0].replace('Answer:', '').trim();
-            const followUpSection = parts[1];
+// Text safe to place inside HTML content or a quoted attribute
+function escapeHtml(value) {
+    return String(value ?? '')
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
 
-            const questionMatches = followUpSection.match(/\d+\.\s*(.+?)(?=\d+\.|$)/gs);
+// Parse a Server-Sent Events response body, calling onEvent(event, data) per message
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const message = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            message.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
 
-            if (questionMatches && questionMatches.length > 0) {
-                followUpHtml = `
-                    <div class="follow-up-section">
-                        <div class="follow-up-section-title">Explore Further</div>
-                        <div style="display: flex; flex-direction: column; gap: 0.75rem;">
-                `;
+// Split the final answer into the main text and clickable follow-up questions
+function renderChatAnswer(messageDiv, textEl, responseText) {
+    let followUpHtml = '';
 
-                questionMatches.forEach((q, index) => {
-                    const cleanQuestion = q.replace(/^\d+\.\s*/, '').trim();
-                    followUpHtml += `
-                        <button class="follow-up-btn" onclick="askFollowUp('${cleanQuestion.replace(/'/g, "\\'")}')">
-                            ${cleanQuestion}
-                        </button>
-                    `;
-                });
+    if (responseText.includes('Follow-up Questions:')) {
+        const parts = responseText.split('Follow-up Questions:');
+        const mainAnswer = parts[0].replace('Answer:', '').trim();
+        const followUpSection = parts[1];
 
-                followUpHtml += '</div></div>';
-            }
+        const questionMatches = followUpSection.match(/\d+\.\s*(.+?)(?=\d+\.|$)/gs);
 
-            responseText = mainAnswer;
-        }
+        if (questionMatches && questionMatches.length > 0) {
+            followUpHtml = `
+                <div class="follow-up-section">
+                    <div class="follow-up-section-title">Explore Further</div>
+                    <div style="display: flex; flex-direction: column; gap: 0.75rem;">
+            `;
 
-        const formattedResponse = responseText.replace(/\n/g, '<br>');
+            questionMatches.forEach((q, index) => {
+                const cleanQuestion = q.replace(/^\d+\.\s*/, '').trim();
+                followUpHtml += `
+                    <button class="follow-up-btn" onclick="askFollowUp('${cleanQuestion.replace(/'/g, "\\'")}')">
+                        ${cleanQuestion}
+                    </button>
+                `;
+            });
 
-        chatWindow.innerHTML += `
-            <div class="chat-message ai">
-                <p>${formattedResponse}</p>
-                ${followUpHtml}
-            </div>
-        `;
-        chatWindow.scrollTop = chatWindow.scrollHeight;
-    } catch (e) {
-        console.error(e);
-        chatWindow.innerHTML += `
-            <div class="chat-message ai">
-                <p style="color:red">Error connecting to tutor.</p>
-            </div>
-        `;
+            followUpHtml += '</div></div>';
+        }
+
+        responseText = mainAnswer;
     }
+
+    textEl.innerHTML = responseText.replace(/\n/g, '<br>');
+    if (followUpHtml) messageDiv.insertAdjacentHTML('beforeend', followUpHtml);
 }
 
 function askFollowUp(question) {